@@ -10,7 +10,12 @@ file (ansible.cfg):
 
     [defaults]
     library = {path}/modules
+    module_utils = {path}/module_utils
     {action_plugins}
+    connection_plugins = {path}/plugins/connection
+    cache_plugins = {path}/plugins/cache
+    strategy_plugins = {path}/plugins/strategy
+    doc_fragment_plugins = {path}/plugins/doc_fragments
 
 For more details on ansible's configuration file visit:
 https://docs.ansible.com/ansible/latest/intro_configuration.html
@@ -0,0 +1,372 @@
+"""Local broker keeping NAPALM driver sessions open for every ansible-playbook run.
+
+The napalm_* modules given ``broker`` lease the session of their device over
+a Unix socket instead of connecting themselves, so concurrent and consecutive
+playbooks share one session per device::
+
+    napalm-ansible-broker --max-sessions 200 --idle-timeout 600
+
+Every client connection holds at most one session at a time, and every
+device is used by one client at a time, the others wait for it.
+"""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import argparse
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+from napalm import get_network_driver
+
+from napalm_ansible.module_utils.napalm_broker import (
+    default_socket_path,
+    read_message,
+    send_message,
+)
+from napalm_ansible.module_utils.napalm_cache import cache_key
+
+# driver methods clients can't call, the broker manages the session itself
+RESERVED_METHODS = ("open", "close")
+
+
+class Session(object):
+    def __init__(self, key, hostname, device):
+        self.key = key
+        self.hostname = hostname
+        self.device = device
+        self.leased = False
+        self.last_used = time.monotonic()
+
+
+def session_key(params):
+    return cache_key(
+        params["dev_os"],
+        params["hostname"],
+        params["username"],
+        params["password"],
+        params.get("timeout"),
+        params.get("optional_args") or {},
+    )
+
+
+def is_alive(device):
+    try:
+        return device.is_alive().get("is_alive", True)
+    except NotImplementedError:
+        return True
+    except Exception:
+        return False
+
+
+def discard_candidate(device):
+    """Discard the candidate config of device, returns whether it is clean."""
+    try:
+        device.discard_config()
+    except NotImplementedError:
+        # the driver has no candidate config
+        pass
+    except Exception:
+        return False
+    return True
+
+
+def close_quietly(sessions):
+    for session in sessions:
+        try:
+            session.device.close()
+        except Exception:
+            pass
+
+
+class SessionPool(object):
+    """Open driver sessions keyed by device and credentials.
+
+    At most max_sessions are open, the least recently used idle session is
+    closed to make room for a new one, and a session idle for idle_timeout
+    seconds is closed by reap().
+    """
+
+    def __init__(self, max_sessions=100, idle_timeout=300, drivers=get_network_driver):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.drivers = drivers
+        # least recently used first
+        self.sessions = OrderedDict()
+        # sessions being opened count against max_sessions
+        self.opening = 0
+        self.device_locks = {}
+        self.changed = threading.Condition()
+
+    def _device_lock(self, hostname):
+        with self.changed:
+            return self.device_locks.setdefault(hostname, threading.Lock())
+
+    def lease(self, params):
+        """Return the session of params and the lock of its device, held until release."""
+        key = session_key(params)
+        lock = self._device_lock(params["hostname"])
+        lock.acquire()
+        try:
+            session = self._reuse(key) or self._open(key, params)
+        except Exception:
+            lock.release()
+            raise
+        return session, lock
+
+    def _reuse(self, key):
+        with self.changed:
+            session = self.sessions.get(key)
+            if session is None:
+                return None
+            session.leased = True
+            self.sessions.move_to_end(key)
+        if is_alive(session.device):
+            return session
+        with self.changed:
+            del self.sessions[key]
+            self.changed.notify_all()
+        close_quietly([session])
+        return None
+
+    def _open(self, key, params):
+        evicted = []
+        with self.changed:
+            while len(self.sessions) + self.opening >= self.max_sessions:
+                idle = [s for s in self.sessions.values() if not s.leased]
+                if idle:
+                    evicted.append(self.sessions.pop(idle[0].key))
+                else:
+                    self.changed.wait()
+            self.opening += 1
+        close_quietly(evicted)
+        try:
+            network_driver = self.drivers(params["dev_os"])
+            device = network_driver(
+                hostname=params["hostname"],
+                username=params["username"],
+                password=params["password"],
+                timeout=params.get("timeout") or 60,
+                optional_args=params.get("optional_args") or {},
+            )
+            device.open()
+        except Exception:
+            with self.changed:
+                self.opening -= 1
+                self.changed.notify_all()
+            raise
+        session = Session(key, params["hostname"], device)
+        session.leased = True
+        with self.changed:
+            self.opening -= 1
+            self.sessions[key] = session
+        return session
+
+    def release(self, session, lock):
+        """Hand session back to the pool, without the candidate config the client left.
+
+        A session whose candidate can't be discarded is closed instead, the
+        next task leasing it would commit the changes of this one.
+        """
+        if not discard_candidate(session.device):
+            with self.changed:
+                if self.sessions.get(session.key) is session:
+                    del self.sessions[session.key]
+                self.changed.notify_all()
+            close_quietly([session])
+            lock.release()
+            return
+        with self.changed:
+            session.leased = False
+            session.last_used = time.monotonic()
+            self.changed.notify_all()
+        lock.release()
+
+    def warm(self, params):
+        """Open the session of params in the background, returns whether it is open."""
+        key = session_key(params)
+        with self.changed:
+            if key in self.sessions:
+                return True
+
+        def open_session():
+            try:
+                self.release(*self.lease(params))
+            except Exception:
+                # the first task leasing the session reports the error
+                pass
+
+        thread = threading.Thread(target=open_session)
+        thread.daemon = True
+        thread.start()
+        return False
+
+    def reap(self):
+        """Close the sessions idle for longer than idle_timeout."""
+        now = time.monotonic()
+        with self.changed:
+            expired = [
+                s
+                for s in self.sessions.values()
+                if not s.leased and now - s.last_used > self.idle_timeout
+            ]
+            for session in expired:
+                del self.sessions[session.key]
+            if expired:
+                self.changed.notify_all()
+        close_quietly(expired)
+
+    def close_all(self):
+        with self.changed:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        close_quietly(sessions)
+
+    def status(self):
+        with self.changed:
+            return {
+                "sessions": len(self.sessions),
+                "leased": len([s for s in self.sessions.values() if s.leased]),
+                "opening": self.opening,
+                "max_sessions": self.max_sessions,
+            }
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """One client: leases a session, runs calls on it and releases it."""
+
+    def handle(self):
+        pool = self.server.pool
+        lease = None
+        try:
+            while True:
+                try:
+                    message = read_message(self.rfile)
+                except (EOFError, ValueError):
+                    break
+                try:
+                    result, lease = self.dispatch(pool, message, lease)
+                except Exception as e:
+                    response = {"error": str(e), "type": type(e).__name__}
+                else:
+                    response = {"result": result}
+                send_message(self.wfile, response)
+        except (IOError, OSError):
+            # the client went away
+            pass
+        finally:
+            if lease is not None:
+                pool.release(*lease)
+
+    def dispatch(self, pool, message, lease):
+        """Run message, returns its result and the lease held afterwards."""
+        method = message.get("method")
+        if method == "open":
+            if lease is not None:
+                raise ValueError("a session is leased already")
+            return None, pool.lease(message)
+        if method == "call":
+            name = message["name"]
+            if lease is None:
+                raise ValueError("no session leased")
+            if name.startswith("_") or name in RESERVED_METHODS:
+                raise ValueError("{} can't be called through the broker".format(name))
+            device = lease[0].device
+            result = getattr(device, name)(
+                *message.get("args", []), **message.get("kwargs", {})
+            )
+            return result, lease
+        if method == "release":
+            if lease is not None:
+                pool.release(*lease)
+            return None, None
+        if method == "warm":
+            return pool.warm(message), lease
+        if method == "status":
+            return pool.status(), lease
+        raise ValueError("unknown method {}".format(method))
+
+
+class Broker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool):
+        self.pool = pool
+        remove_stale_socket(socket_path)
+        # only the user running the broker can use the sessions
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_path, BrokerHandler)
+        finally:
+            os.umask(umask)
+
+
+def remove_stale_socket(socket_path):
+    """Remove the socket left by a broker that is gone, fail if one still listens."""
+    if not os.path.exists(socket_path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (IOError, OSError):
+        os.unlink(socket_path)
+    else:
+        raise SystemExit("a broker is listening on {} already".format(socket_path))
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Keep NAPALM driver sessions open for the napalm_* modules."
+    )
+    parser.add_argument("--socket", default=default_socket_path())
+    parser.add_argument("--max-sessions", type=int, default=100)
+    parser.add_argument(
+        "--idle-timeout",
+        type=int,
+        default=300,
+        help="seconds an unused session is kept open",
+    )
+    args = parser.parse_args(argv)
+
+    socket_path = os.path.expanduser(args.socket)
+    directory = os.path.dirname(socket_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    pool = SessionPool(args.max_sessions, args.idle_timeout)
+    server = Broker(socket_path, pool)
+
+    stop = threading.Event()
+
+    def reap():
+        while not stop.wait(min(args.idle_timeout, 30)):
+            pool.reap()
+
+    def shutdown(signum, frame):
+        stop.set()
+        # shutdown() waits for serve_forever, which runs in this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    reaper = threading.Thread(target=reap)
+    reaper.daemon = True
+    reaper.start()
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        pool.close_all()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
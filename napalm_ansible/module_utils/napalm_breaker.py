@@ -0,0 +1,153 @@
+"""Circuit breaker of the devices failing to connect, shared by every run."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+
+
+class CircuitOpen(Exception):
+    """The circuit of the device is open, it was not contacted."""
+
+
+class CircuitBreaker(object):
+    """Consecutive connection failures of every host, one file per host.
+
+    After a failure the circuit of the host is open for ``window`` seconds,
+    doubled after every consecutive failure up to ``max_window``. Once it
+    elapses the next attempt goes through (half-open): a success closes the
+    circuit, a failure opens it again for a longer window. The other tasks
+    stay out meanwhile, unless that attempt records nothing for
+    ``probe_timeout`` seconds (its task died). The file of the host is
+    updated under a lock, concurrent tasks can't all claim the attempt.
+    """
+
+    def __init__(self, window, max_window=86400, breaker_dir=None, probe_timeout=300):
+        self.window = window
+        self.max_window = max_window
+        self.probe_timeout = probe_timeout
+        self.breaker_dir = os.path.expanduser(breaker_dir or state_dir("breaker"))
+
+    def _path(self, hostname):
+        return os.path.join(self.breaker_dir, cache_key(hostname) + CACHE_SUFFIX)
+
+    @contextmanager
+    def _locked(self, hostname):
+        """Hold the lock of the file of hostname, not at all if it can't be created."""
+        lock = None
+        try:
+            if not os.path.isdir(self.breaker_dir):
+                os.makedirs(self.breaker_dir)
+        except OSError:
+            # created by a task running at the same time, or not writable
+            pass
+        try:
+            lock = open(
+                os.path.join(self.breaker_dir, cache_key(hostname) + ".lock"), "a"
+            )
+        except (IOError, OSError):
+            pass
+        if lock is None:
+            # the breaker is only an optimization, like writing its state
+            yield
+            return
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+        finally:
+            lock.close()
+
+    def state(self, hostname):
+        """Return the failures of hostname, None when its circuit is closed."""
+        try:
+            return read_gzip_json(self._path(hostname))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def check(self, hostname):
+        """Raise CircuitOpen if hostname must not be contacted yet.
+
+        Past the window, the first caller claims the half-open attempt, the
+        others raise CircuitOpen until its success or failure is recorded.
+        """
+        if self.state(hostname) is None:
+            return
+        with self._locked(hostname):
+            state = self.state(hostname)
+            if state is None:
+                return
+            now = time.time()
+            remaining = state["retry_at"] - now
+            if remaining > 0:
+                raise CircuitOpen(
+                    "circuit open after {} consecutive failures, next attempt in {}s "
+                    "(last error: {})".format(
+                        state["failures"], int(remaining) + 1, state["msg"]
+                    )
+                )
+            if state.get("probing_until", 0) > now:
+                raise CircuitOpen(
+                    "circuit half-open after {} consecutive failures, another task "
+                    "is trying the device (last error: {})".format(
+                        state["failures"], state["msg"]
+                    )
+                )
+            state["probing_until"] = now + self.probe_timeout
+            try:
+                write_gzip_json(self._path(hostname), state)
+            except (IOError, OSError):
+                pass
+
+    def failure(self, hostname, msg):
+        with self._locked(hostname):
+            state = self.state(hostname) or {"failures": 0}
+            failures = state["failures"] + 1
+            window = min(self.window * 2 ** (failures - 1), self.max_window)
+            now = time.time()
+            state = {
+                "failures": failures,
+                "failed": now,
+                "retry_at": now + window,
+                "msg": msg,
+            }
+            try:
+                write_gzip_json(self._path(hostname), state)
+            except (IOError, OSError):
+                pass
+
+    def release(self, hostname):
+        """Give up the half-open attempt claimed by check, nothing was recorded."""
+        with self._locked(hostname):
+            state = self.state(hostname)
+            if state is None or "probing_until" not in state:
+                return
+            del state["probing_until"]
+            try:
+                write_gzip_json(self._path(hostname), state)
+            except (IOError, OSError):
+                pass
+
+    def success(self, hostname):
+        with self._locked(hostname):
+            try:
+                os.unlink(self._path(hostname))
+            except OSError:
+                pass
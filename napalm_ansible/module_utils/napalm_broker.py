@@ -0,0 +1,151 @@
+"""Client of the napalm-ansible broker, which keeps driver sessions open across runs."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import json
+import os
+import socket
+import threading
+
+try:
+    from ansible.module_utils.napalm_cache import state_dir
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import state_dir
+
+
+def default_socket_path():
+    return state_dir("broker.sock")
+
+
+def send_message(stream, message):
+    """Write message to stream as one line of JSON."""
+    stream.write(json.dumps(message, default=str).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def read_message(stream):
+    """Read a message written by send_message, EOFError once the peer is gone."""
+    line = stream.readline()
+    if not line:
+        raise EOFError("connection closed by the peer")
+    return json.loads(line.decode("utf-8"))
+
+
+class BrokerError(Exception):
+    """The broker could not be reached, or failed to lease the session or run a call.
+
+    ``remote_type`` is the name of the exception the broker got, if any.
+    """
+
+    def __init__(self, message, remote_type=None):
+        super(BrokerError, self).__init__(message)
+        self.remote_type = remote_type
+
+
+class BrokerDevice(object):
+    """Proxy to a NAPALM driver session leased from the broker.
+
+    open() leases the session of the device, the broker opens it if it has
+    none, and holds the device for this client only until close(), which
+    hands the session back to the broker still open. Method calls are run by
+    the broker on the leased session.
+    """
+
+    def __init__(
+        self,
+        socket_path,
+        dev_os,
+        hostname,
+        username,
+        password,
+        timeout=60,
+        optional_args=None,
+    ):
+        self.socket_path = os.path.expanduser(socket_path)
+        self._params = {
+            "dev_os": dev_os,
+            "hostname": hostname,
+            "username": username,
+            "password": password,
+            "timeout": timeout,
+            "optional_args": optional_args or {},
+        }
+        self._sock = None
+        self._stream = None
+        # getters running on threads share the lease
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._request(
+                {"method": "call", "name": name, "args": args, "kwargs": kwargs}
+            )
+
+        return call
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except (IOError, OSError) as e:
+            sock.close()
+            raise BrokerError(
+                "cannot reach the broker at {}: {}".format(self.socket_path, e)
+            )
+        self._sock = sock
+        self._stream = sock.makefile("rwb")
+
+    def _disconnect(self):
+        if self._sock is None:
+            return
+        self._stream.close()
+        self._sock.close()
+        self._sock = self._stream = None
+
+    def _request(self, message):
+        if self._sock is None:
+            raise BrokerError("no session leased from the broker")
+        with self._lock:
+            try:
+                send_message(self._stream, message)
+                response = read_message(self._stream)
+            except (IOError, OSError, EOFError) as e:
+                raise BrokerError("lost the connection to the broker: {}".format(e))
+        if "error" in response:
+            if response.get("type") == "NotImplementedError":
+                raise NotImplementedError(response["error"])
+            raise BrokerError(response["error"], response.get("type"))
+        return response.get("result")
+
+    def open(self):
+        self._connect()
+        try:
+            self._request(dict(self._params, method="open"))
+        except Exception:
+            self._disconnect()
+            raise
+
+    def close(self):
+        """Hand the session back to the broker, it stays open for the next tasks."""
+        try:
+            self._request({"method": "release"})
+        finally:
+            self._disconnect()
+
+    def open_session(self, wait=False):
+        """Have the broker open the session ahead of the first task needing it.
+
+        Unless wait, the broker opens it in the background. Returns whether it
+        is open already.
+        """
+        if wait:
+            self.open()
+            self.close()
+            return True
+        self._connect()
+        try:
+            return self._request(dict(self._params, method="warm"))
+        finally:
+            self._disconnect()
@@ -0,0 +1,120 @@
+"""On-disk cache of NAPALM getter results."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Default location of the state kept between runs (cache, snapshots, stats...)
+STATE_DIR_ENV = "NAPALM_ANSIBLE_STATE_DIR"
+DEFAULT_STATE_DIR = "~/.ansible/napalm"
+
+CACHE_SUFFIX = ".json.gz"
+
+
+def state_dir(*parts):
+    """Return a directory under the napalm-ansible state directory."""
+    base = os.environ.get(STATE_DIR_ENV) or DEFAULT_STATE_DIR
+    return os.path.join(os.path.expanduser(base), *parts)
+
+
+def cache_key(*parts):
+    """Stable key for parts that can be serialized to JSON."""
+    serialized = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def read_gzip_json(path):
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
+
+
+def write_atomic(path, data):
+    """Write the bytes data to path atomically, readers never see a partial file.
+
+    The file is only readable by its owner.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_gzip_json(path, value):
+    """Write value to path atomically, readers never see a partial file."""
+    serialized = json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+    write_atomic(path, gzip.compress(serialized))
+
+
+def evict_lru(directory, max_size, suffix=CACHE_SUFFIX):
+    """Remove the least recently used files until directory fits in max_size bytes.
+
+    Reads touch the files, so the modification time is the last use.
+    """
+    if not max_size or not os.path.isdir(directory):
+        return
+    entries = []
+    total = 0
+    for name in os.listdir(directory):
+        # skip the temporary files of writes in progress
+        if not name.endswith(suffix) or name.endswith(".tmp"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+class FactsCache(object):
+    """Getter results stored as one gzipped JSON file per key.
+
+    Entries older than the TTL given on lookup are stale. Once the directory
+    grows over ``max_size`` bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, max_size=0):
+        self.cache_dir = os.path.expanduser(cache_dir or state_dir("facts_cache"))
+        self.max_size = max_size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key, ttl):
+        """Return the cached value, None if missing or older than ttl seconds."""
+        path = self._path(key)
+        try:
+            entry = read_gzip_json(path)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry["stored"] > ttl:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def set(self, key, value):
+        write_gzip_json(self._path(key), {"stored": time.time(), "value": value})
+        evict_lru(self.cache_dir, self.max_size)
@@ -0,0 +1,100 @@
+"""Getters implemented by every NAPALM driver, persisted between runs."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import os
+import sys
+import threading
+
+try:
+    from napalm.base import NetworkDriver
+except ImportError:
+    NetworkDriver = None
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+
+_capabilities = {}
+_lock = threading.Lock()
+
+
+def driver_version(network_driver):
+    """Version of the package shipping the driver, empty if unknown."""
+    package = network_driver.__module__.split(".")[0]
+    try:
+        from importlib.metadata import version
+
+        return version(package)
+    except Exception:
+        return str(getattr(sys.modules.get(package), "__version__", ""))
+
+
+def inspect_driver(network_driver):
+    """Return the get_* methods of the driver and the ones it doesn't implement.
+
+    A getter is not implemented when the driver inherits it from NetworkDriver,
+    which only raises NotImplementedError. Drivers resolving their methods at
+    runtime (like the mock driver) can't be inspected, all their getters are
+    assumed implemented.
+    """
+    getters = sorted(name for name in dir(network_driver) if name.startswith("get_"))
+    dynamic = NetworkDriver is None or any(
+        attr in vars(cls)
+        for cls in network_driver.__mro__
+        if cls not in (NetworkDriver, object)
+        for attr in ("__getattr__", "__getattribute__")
+    )
+    not_implemented = []
+    if not dynamic:
+        not_implemented = [
+            name
+            for name in getters
+            if getattr(network_driver, name) is getattr(NetworkDriver, name, None)
+        ]
+    return {"getters": getters, "not_implemented": not_implemented}
+
+
+def driver_capabilities(network_driver, dev_os, capabilities_dir=None):
+    """Return the capabilities of the driver.
+
+    They are inspected once per driver and version, and kept in memory and
+    in capabilities_dir for the next runs.
+    """
+    key = cache_key(
+        dev_os,
+        network_driver.__module__,
+        network_driver.__name__,
+        driver_version(network_driver),
+    )
+    with _lock:
+        if key in _capabilities:
+            return _capabilities[key]
+
+    directory = os.path.expanduser(capabilities_dir or state_dir("capabilities"))
+    path = os.path.join(directory, key + CACHE_SUFFIX)
+    try:
+        capabilities = read_gzip_json(path)
+    except (IOError, OSError, ValueError):
+        capabilities = inspect_driver(network_driver)
+        try:
+            write_gzip_json(path, capabilities)
+        except (IOError, OSError):
+            # the matrix is only an optimization, it is rebuilt next time
+            pass
+
+    with _lock:
+        _capabilities[key] = capabilities
+    return capabilities
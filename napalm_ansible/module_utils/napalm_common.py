@@ -0,0 +1,389 @@
+"""Helpers shared by the napalm-ansible modules."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import asyncio
+import inspect
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ansible.module_utils.connection import Connection, ConnectionError
+
+try:
+    from ansible.module_utils.napalm_breaker import CircuitBreaker, CircuitOpen
+except ImportError:
+    from napalm_ansible.module_utils.napalm_breaker import CircuitBreaker, CircuitOpen
+
+try:
+    from ansible.module_utils.napalm_broker import BrokerDevice
+except ImportError:
+    from napalm_ansible.module_utils.napalm_broker import BrokerDevice
+
+try:
+    from ansible.module_utils.napalm_credentials import (
+        CREDENTIALS_SPEC,
+        CredentialRotation,
+        CredentialStore,
+        cryptography_found,
+        with_credential,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_credentials import (
+        CREDENTIALS_SPEC,
+        CredentialRotation,
+        CredentialStore,
+        cryptography_found,
+        with_credential,
+    )
+
+try:
+    from ansible.module_utils.napalm_detect import DETECT_SPEC, DetectionError, Detector
+except ImportError:
+    from napalm_ansible.module_utils.napalm_detect import (
+        DETECT_SPEC,
+        DetectionError,
+        Detector,
+    )
+
+try:
+    from ansible.module_utils.napalm_limiter import (
+        LIMITS_SPEC,
+        LimitTimeout,
+        Limiter,
+        limited,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_limiter import (
+        LIMITS_SPEC,
+        LimitTimeout,
+        Limiter,
+        limited,
+    )
+
+try:
+    from ansible.module_utils.napalm_stats import OperationStats, timed
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import OperationStats, timed
+
+# argument spec of the options opening the session, merged into the one of the
+# modules connecting to the device and documented in the napalm doc fragment
+CONNECTION_SPEC = dict(
+    connect_timeout=dict(type="float", required=False, default=0),
+    circuit_breaker=dict(type="int", required=False, default=0),
+    adaptive_timeout=dict(type="bool", required=False, default=False),
+    broker=dict(type="str", required=False),
+    limits=dict(type="list", elements="dict", required=False, options=LIMITS_SPEC),
+    limit_timeout=dict(type="int", required=False, default=300),
+    credentials=dict(
+        type="list", elements="dict", required=False, options=CREDENTIALS_SPEC
+    ),
+    credentials_key=dict(type="str", required=False, no_log=True),
+    detect=dict(type="dict", required=False, options=DETECT_SPEC),
+)
+
+# JSON-RPC error code the napalm connection plugin uses to report a NotImplementedError
+# raised by the driver. Keep in sync with plugins/connection/napalm.py
+NOT_IMPLEMENTED_ERROR = -32001
+
+# Ports of the transports of the drivers shipped with napalm
+TRANSPORT_PORTS = {"ssh": 22, "telnet": 23, "http": 80, "https": 443}
+DEFAULT_TRANSPORTS = {
+    "eos": "https",
+    "ios": "ssh",
+    "iosxr": "ssh",
+    "junos": "ssh",
+    "nxos": "https",
+    "nxos_ssh": "ssh",
+}
+DEFAULT_PORTS = {"iosxr_netconf": 830}
+
+
+class PersistentDevice(object):
+    """Proxy to the NAPALM driver held open by the napalm connection plugin.
+
+    Method calls are forwarded over the persistent connection socket, so the
+    session opened by an earlier task is reused instead of reconnecting.
+    """
+
+    def __init__(self, socket_path):
+        self._connection = Connection(socket_path)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            try:
+                return self._connection.napalm_call(name, *args, **kwargs)
+            except ConnectionError as e:
+                if getattr(e, "code", None) == NOT_IMPLEMENTED_ERROR:
+                    raise NotImplementedError(str(e))
+                raise
+
+        return call
+
+    def open(self):
+        # The session is opened (once) by the connection plugin
+        pass
+
+    def open_session(self, wait=False):
+        """Have the connection plugin open the session ahead of the first call.
+
+        Unless wait, the session opens in the background of the connection.
+        Returns whether it is open already.
+        """
+        return self._connection.napalm_open(wait=wait)
+
+    def close(self):
+        # The session outlives the task; the connection plugin closes it
+        pass
+
+
+def transport_port(dev_os, optional_args=None):
+    """Return the TCP port the driver connects to, None if unknown."""
+    optional_args = optional_args or {}
+    if optional_args.get("port"):
+        return int(optional_args["port"])
+    transport = (
+        optional_args.get("transport")
+        or optional_args.get("eos_transport")
+        or DEFAULT_TRANSPORTS.get(dev_os)
+    )
+    if transport in TRANSPORT_PORTS:
+        return TRANSPORT_PORTS[transport]
+    return DEFAULT_PORTS.get(dev_os)
+
+
+def check_reachable(hostname, dev_os, optional_args, connect_timeout):
+    """Open (and close) a TCP connection to the transport port of the device.
+
+    Returns the port and the seconds it took, the port is None when it is
+    unknown and nothing was checked. Raises OSError when unreachable.
+    """
+    port = transport_port(dev_os, optional_args)
+    if port is None:
+        return None, 0.0
+    start = time.monotonic()
+    try:
+        sock = socket.create_connection((hostname, port), timeout=connect_timeout)
+    except OSError as e:
+        raise OSError("{}:{} is unreachable: {}".format(hostname, port, e))
+    sock.close()
+    return port, time.monotonic() - start
+
+
+def connect_device(
+    new_session,
+    hostname,
+    dev_os,
+    optional_args,
+    connect_timeout=0,
+    breaker=None,
+    stats=None,
+    limiter=None,
+):
+    """Return the session opened by new_session().
+
+    With connect_timeout the transport port is checked first, an unreachable
+    device fails in that time instead of the driver's timeout. With a breaker,
+    a device whose circuit is open raises CircuitOpen without being contacted
+    and the outcome of the attempt is recorded. The session is opened within
+    the ``open`` limits of limiter, timing out on them doesn't count against
+    the breaker, and the time it takes is recorded in stats as ``open``.
+    """
+    if breaker is not None:
+        breaker.check(hostname)
+    try:
+        if connect_timeout:
+            check_reachable(hostname, dev_os, optional_args, connect_timeout)
+        with limited(limiter, "open"), timed(stats, "open"):
+            device = new_session()
+    except LimitTimeout:
+        # the controller was busy, not the device
+        if breaker is not None:
+            breaker.release(hostname)
+        raise
+    except Exception as e:
+        if breaker is not None:
+            breaker.failure(hostname, str(e))
+        raise
+    if breaker is not None:
+        breaker.success(hostname)
+    return device
+
+
+def open_breaker(module):
+    """Return the CircuitBreaker of the task, None if disabled."""
+    if not module.params.get("circuit_breaker"):
+        return None
+    return CircuitBreaker(module.params["circuit_breaker"])
+
+
+def open_limiter(module):
+    """Return the Limiter of the task, None without limits."""
+    if not module.params.get("limits"):
+        return None
+    return Limiter(module.params["limits"], module.params.get("limit_timeout") or 300)
+
+
+def open_credential_store(module):
+    """Return the CredentialStore of the task, None without credentials."""
+    if not module.params.get("credentials"):
+        return None
+    if not cryptography_found:
+        module.fail_json(
+            msg="the python module cryptography is required for credentials"
+        )
+    try:
+        return CredentialStore(module.params.get("credentials_key"))
+    except (IOError, OSError, ValueError) as e:
+        module.fail_json(msg="cannot open the credential store: " + str(e))
+
+
+def open_credentials(module, hostname):
+    """Return the CredentialRotation of hostname, None without credentials."""
+    store = open_credential_store(module)
+    if store is None:
+        return None
+    return CredentialRotation(module.params["credentials"], store, hostname)
+
+
+def detect_dev_os(module, hostname):
+    """Detect the dev_os of hostname with ``dev_os: auto``.
+
+    Returns the detection (dev_os, the fingerprint that matched and whether
+    it was cached) and sets the dev_os of the task, None without auto.
+    """
+    if module.params.get("dev_os") != "auto":
+        return None
+    try:
+        detection = Detector(module.params.get("detect")).detect_dev_os(hostname)
+    except DetectionError as e:
+        module.fail_json(msg="cannot detect the dev_os of the device: " + str(e))
+    module.params["dev_os"] = detection["dev_os"]
+    return detection
+
+
+def open_stats(module, hostname):
+    """Return the OperationStats of hostname with adaptive_timeout, None otherwise."""
+    if not module.params.get("adaptive_timeout"):
+        return None
+    return OperationStats(hostname)
+
+
+def task_timeout(module, stats, operations):
+    """Return the timeout of the driver running operations.
+
+    Derived from the stats of the host with adaptive_timeout, the timeout
+    option is used until every operation (and opening the session) has
+    enough history and caps the derived one: the option can't tell a timeout
+    set on the task from its default, the action plugin's one included.
+    """
+    if stats is None or not module.params.get("adaptive_timeout"):
+        return module.params["timeout"]
+    return stats.timeout(["open"] + list(operations), module.params["timeout"])
+
+
+def session_factory(
+    network_driver, broker=None, dev_os=None, credentials=None, **kwargs
+):
+    """Return a function opening a new session to the device.
+
+    With broker (the path of its socket) the session is leased from the broker
+    instead, dev_os is needed for it to select the driver. With credentials (a
+    CredentialRotation) they are tried in turn instead of the kwargs ones.
+    """
+
+    def open_with(settings):
+        if broker:
+            device = BrokerDevice(broker, dev_os, **settings)
+        else:
+            device = network_driver(**settings)
+        device.open()
+        return device
+
+    def new_session():
+        if credentials is None:
+            return open_with(kwargs)
+        return credentials.open(
+            lambda credential: open_with(with_credential(kwargs, credential))
+        )
+
+    return new_session
+
+
+def open_device(module, network_driver, stats=None, credentials=None, **kwargs):
+    """Return an open NAPALM device for the task.
+
+    With ``connection: napalm`` the driver held by the persistent connection is
+    used. With ``broker`` the session is leased from the broker, otherwise a
+    new driver is instantiated with kwargs and opened, see connect_device for
+    ``connect_timeout``, ``circuit_breaker``, ``limits`` and stats. credentials
+    (see open_credentials) replace the username and password of kwargs.
+    """
+    socket_path = getattr(module, "_socket_path", None)
+    if socket_path:
+        return PersistentDevice(socket_path)
+
+    new_session = session_factory(
+        network_driver,
+        module.params.get("broker"),
+        module.params.get("dev_os"),
+        credentials,
+        **kwargs
+    )
+
+    try:
+        return connect_device(
+            new_session,
+            kwargs["hostname"],
+            module.params.get("dev_os"),
+            kwargs.get("optional_args"),
+            module.params.get("connect_timeout"),
+            open_breaker(module),
+            stats,
+            open_limiter(module),
+        )
+    except CircuitOpen as e:
+        module.fail_json(msg="cannot connect to device: " + str(e), circuit_open=True)
+    except Exception as e:
+        module.fail_json(msg="cannot connect to device: " + str(e))
+
+
+def map_targets(func, targets, workers, engine="threads"):
+    """Run func on every target, at most workers at the same time.
+
+    Returns the results in the order of targets. With the ``asyncio`` engine a
+    single event loop keeps the targets in flight: coroutine functions are
+    awaited directly and blocking functions, like the NAPALM drivers, run in a
+    thread executor of the same size as the ``threads`` pool, so they get no
+    more concurrency from it.
+    """
+    if not targets:
+        return []
+    workers = max(1, min(workers, len(targets)))
+    if engine == "asyncio":
+        return _map_targets_asyncio(func, targets, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, targets))
+
+
+def _map_targets_asyncio(func, targets, workers):
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def run_all():
+        in_flight = asyncio.Semaphore(workers)
+
+        async def run(target):
+            async with in_flight:
+                if inspect.iscoroutinefunction(func):
+                    return await func(target)
+                return await loop.run_in_executor(executor, func, target)
+
+        return await asyncio.gather(*[run(target) for target in targets])
+
+    try:
+        return loop.run_until_complete(run_all())
+    finally:
+        executor.shutdown(wait=True)
+        loop.close()
@@ -0,0 +1,171 @@
+"""Credential sets tried in turn, the last one that worked for a host goes first."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import json
+import os
+import re
+
+cryptography_found = False
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+
+    cryptography_found = True
+except ImportError:
+    pass
+
+try:
+    from ansible.module_utils.napalm_cache import cache_key, state_dir, write_atomic
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        cache_key,
+        state_dir,
+        write_atomic,
+    )
+
+# argument spec of the items of the credentials option
+CREDENTIALS_SPEC = dict(
+    name=dict(type="str", required=False),
+    username=dict(type="str", required=True),
+    password=dict(type="str", required=False, no_log=True),
+    optional_args=dict(type="dict", required=False),
+)
+
+KEY_ENV = "NAPALM_ANSIBLE_CREDENTIALS_KEY"
+
+# names of the authentication exceptions of napalm and the driver libraries:
+# ConnectAuthError, NetmikoAuthenticationException, NXAPIAuthError,
+# paramiko's AuthenticationException, ncclient's AuthenticationError
+AUTH_ERROR_NAME = re.compile(r"Auth(entication)?(Error|Exception)$")
+# drivers wrapping the rejection in a ConnectionException, eAPI answers 401
+AUTH_ERROR_MESSAGE = re.compile(r"unauthori[sz]ed|authentication failed", re.I)
+
+
+class CredentialsRejected(Exception):
+    """The device rejected every credential."""
+
+
+def is_auth_error(e):
+    """Whether e is the device rejecting the credential."""
+    names = [cls.__name__ for cls in type(e).__mro__]
+    # raised by the broker for the session it opened
+    names.append(getattr(e, "remote_type", None) or "")
+    if any(AUTH_ERROR_NAME.search(name) for name in names):
+        return True
+    return bool(AUTH_ERROR_MESSAGE.search(str(e)))
+
+
+def with_credential(kwargs, credential):
+    """Return the driver kwargs logging in with credential."""
+    optional_args = dict(kwargs.get("optional_args") or {})
+    optional_args.update(credential.get("optional_args") or {})
+    return dict(
+        kwargs,
+        username=credential["username"],
+        password=credential.get("password"),
+        optional_args=optional_args,
+    )
+
+
+def credential_name(credential):
+    """Name of credential in results and errors, never its password."""
+    return credential.get("name") or credential["username"]
+
+
+def credential_ref(credential):
+    """Reference of credential in the store."""
+    return credential.get("name") or cache_key(
+        credential["username"], credential.get("password")
+    )
+
+
+class CredentialStore(object):
+    """Reference of the credential that last opened a session, per host.
+
+    One file per host, encrypted with the key of ``NAPALM_ANSIBLE_CREDENTIALS_KEY``
+    (or the one given), otherwise with a key generated on first use in a file
+    only its owner can read.
+    """
+
+    def __init__(self, key=None, store_dir=None):
+        self.store_dir = os.path.expanduser(store_dir or state_dir("credentials"))
+        self.fernet = Fernet(key or os.environ.get(KEY_ENV) or self._load_key())
+
+    def _load_key(self):
+        path = self.store_dir + ".key"
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except OSError:
+            # created already, possibly by a task running at the same time
+            with open(path, "rb") as f:
+                return f.read().strip()
+        key = Fernet.generate_key()
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+    def _path(self, hostname):
+        return os.path.join(self.store_dir, cache_key(hostname) + ".enc")
+
+    def get(self, hostname):
+        """Return the reference remembered for hostname, None if unknown."""
+        try:
+            with open(self._path(hostname), "rb") as f:
+                entry = json.loads(self.fernet.decrypt(f.read()).decode("utf-8"))
+        except (IOError, OSError, ValueError, InvalidToken):
+            return None
+        return entry.get("credential")
+
+    def remember(self, hostname, credential):
+        entry = json.dumps({"credential": credential_ref(credential)})
+        try:
+            write_atomic(self._path(hostname), self.fernet.encrypt(entry.encode()))
+        except (IOError, OSError):
+            pass
+
+
+class CredentialRotation(object):
+    """Opens a session with the first of credentials the device accepts.
+
+    The credential remembered for the host is tried first, the next one only
+    when the device rejects it (see is_auth_error), any other error is raised
+    right away. The one that works is remembered for the next runs. ``used``
+    is its name.
+    """
+
+    def __init__(self, credentials, store, hostname):
+        self.credentials = credentials
+        self.store = store
+        self.hostname = hostname
+        self.used = None
+
+    def open(self, new_session_with):
+        """Return new_session_with(credential) of the first credential that works."""
+        remembered = self.store.get(self.hostname)
+        ordered = sorted(
+            self.credentials,
+            key=lambda credential: credential_ref(credential) != remembered,
+        )
+        errors = []
+        for credential in ordered:
+            try:
+                device = new_session_with(credential)
+            except Exception as e:
+                if not is_auth_error(e):
+                    # unreachable or timing out, the next credential would too
+                    raise
+                errors.append("{}: {}".format(credential_name(credential), e))
+                continue
+            if credential_ref(credential) != remembered:
+                self.store.remember(self.hostname, credential)
+            self.used = credential_name(credential)
+            return device
+        raise CredentialsRejected(
+            "no credentials opened a session ({})".format("; ".join(errors))
+        )
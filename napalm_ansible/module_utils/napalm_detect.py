@@ -0,0 +1,236 @@
+"""Detection of the dev_os of a device from cheap fingerprints, cached per host."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import os
+import random
+import re
+import socket
+import ssl
+import time
+
+try:
+    from http.client import HTTPSConnection
+except ImportError:
+    from httplib import HTTPSConnection
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+
+# argument spec of the detect option
+DETECT_SPEC = dict(
+    snmp_community=dict(type="str", required=False, no_log=True),
+    snmp_port=dict(type="int", required=False, default=161),
+    ssh_port=dict(type="int", required=False, default=22),
+    https_port=dict(type="int", required=False, default=443),
+    timeout=dict(type="float", required=False, default=3),
+    signatures=dict(type="dict", required=False),
+    refresh=dict(type="bool", required=False, default=False),
+)
+
+# fingerprints of the core drivers, the first match wins
+SIGNATURES = [
+    ("iosxr", r"IOS[ -]XR|Cisco-2\.0"),
+    ("nxos", r"NX-OS|Nexus|NX-API"),
+    ("eos", r"Arista|\bEOS\b"),
+    ("junos", r"JUNOS|Juniper"),
+    ("ios", r"Cisco IOS|IOS-XE|Cisco-1\."),
+]
+
+SYS_DESCR_OID = (1, 3, 6, 1, 2, 1, 1, 1, 0)
+
+
+class DetectionError(Exception):
+    """None of the fingerprints of the device matched a driver."""
+
+
+def ber(tag, value):
+    """Encode a BER TLV."""
+    length = len(value)
+    if length < 0x80:
+        encoded = bytes([length])
+    else:
+        size = (length.bit_length() + 7) // 8
+        encoded = bytes([0x80 | size]) + length.to_bytes(size, "big")
+    return bytes([tag]) + encoded + value
+
+
+def ber_integer(value):
+    size = max(1, (value.bit_length() + 8) // 8)
+    return ber(0x02, value.to_bytes(size, "big", signed=True))
+
+
+def ber_oid(oid):
+    encoded = bytearray([40 * oid[0] + oid[1]])
+    for arc in oid[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.insert(0, 0x80 | (arc & 0x7F))
+            arc >>= 7
+        encoded.extend(chunk)
+    return ber(0x06, bytes(encoded))
+
+
+def ber_children(data):
+    """Return the (tag, value) of the TLVs in data."""
+    children = []
+    offset = 0
+    while offset < len(data):
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[offset : offset + size], "big")
+            offset += size
+        children.append((tag, data[offset : offset + length]))
+        offset += length
+    return children
+
+
+def snmp_sys_descr(hostname, community, port=161, timeout=3):
+    """Return the sysDescr of the device, with an SNMPv2c get."""
+    request_id = random.randint(1, 0x7FFFFFFF)
+    varbind = ber(0x30, ber_oid(SYS_DESCR_OID) + ber(0x05, b""))
+    pdu = ber(
+        0xA0,
+        ber_integer(request_id) + ber_integer(0) + ber_integer(0) + ber(0x30, varbind),
+    )
+    message = ber(0x30, ber_integer(1) + ber(0x04, community.encode("utf-8")) + pdu)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(message, (hostname, port))
+        response, _ = sock.recvfrom(65535)
+    finally:
+        sock.close()
+    try:
+        _, _, pdu = ber_children(ber_children(response)[0][1])
+        _, error, _, varbinds = ber_children(pdu[1])
+        _, value = ber_children(ber_children(varbinds[1])[0][1])
+    except (IndexError, ValueError):
+        raise ValueError("malformed SNMP response")
+    if int.from_bytes(error[1], "big") or value[0] != 0x04:
+        raise ValueError("no sysDescr in the SNMP response")
+    return value[1].decode("utf-8", "replace")
+
+
+def ssh_banner(hostname, port=22, timeout=3):
+    """Return the identification string the SSH server sends first."""
+    sock = socket.create_connection((hostname, port), timeout=timeout)
+    try:
+        banner = b""
+        while b"\n" not in banner and len(banner) < 255:
+            chunk = sock.recv(255)
+            if not chunk:
+                break
+            banner += chunk
+    finally:
+        sock.close()
+    return banner.decode("utf-8", "replace").strip()
+
+
+def https_page(hostname, port=443, timeout=3):
+    """Return the headers and the start of the landing page of the HTTPS server."""
+    context = ssl.create_default_context()
+    # only fingerprinting, the certificates of the devices are often self-signed
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    connection = HTTPSConnection(hostname, port, timeout=timeout, context=context)
+    try:
+        connection.request("GET", "/")
+        response = connection.getresponse()
+        headers = "\n".join(": ".join(header) for header in response.getheaders())
+        return headers + "\n" + response.read(4096).decode("utf-8", "replace")
+    finally:
+        connection.close()
+
+
+def match_signature(text, signatures):
+    for dev_os, pattern in signatures:
+        if re.search(pattern, text, re.I):
+            return dev_os
+    return None
+
+
+class Detector(object):
+    """Finds the dev_os of the devices, remembers it per host.
+
+    The fingerprints are tried cheapest first: the SNMP sysDescr (with a
+    community), the SSH banner and the HTTPS landing page. ``signatures``
+    maps more drivers to a pattern, they are tried before the core ones.
+    """
+
+    def __init__(self, detect=None, detect_dir=None):
+        self.detect = dict(
+            (k, v["default"]) for k, v in DETECT_SPEC.items() if "default" in v
+        )
+        self.detect.update(
+            dict((k, v) for k, v in (detect or {}).items() if v is not None)
+        )
+        self.signatures = list((self.detect.get("signatures") or {}).items())
+        self.signatures += SIGNATURES
+        self.detect_dir = os.path.expanduser(detect_dir or state_dir("detect"))
+
+    def _path(self, hostname):
+        return os.path.join(self.detect_dir, cache_key(hostname) + CACHE_SUFFIX)
+
+    def fingerprints(self, hostname):
+        """Yield (source, function) of the fingerprints to try, cheapest first."""
+        timeout = self.detect["timeout"]
+        if self.detect.get("snmp_community"):
+            yield "snmp", lambda: snmp_sys_descr(
+                hostname,
+                self.detect["snmp_community"],
+                self.detect["snmp_port"],
+                timeout,
+            )
+        yield "ssh", lambda: ssh_banner(hostname, self.detect["ssh_port"], timeout)
+        yield "https", lambda: https_page(hostname, self.detect["https_port"], timeout)
+
+    def detect_dev_os(self, hostname):
+        """Return {dev_os, source, cached} of hostname, raise DetectionError."""
+        if not self.detect["refresh"]:
+            try:
+                detection = read_gzip_json(self._path(hostname))
+                detection["cached"] = True
+                return detection
+            except (IOError, OSError, ValueError):
+                pass
+
+        errors = []
+        for source, fingerprint in self.fingerprints(hostname):
+            try:
+                text = fingerprint()
+            except Exception as e:
+                errors.append("{}: {}".format(source, e))
+                continue
+            dev_os = match_signature(text, self.signatures)
+            if dev_os is None:
+                errors.append("{}: no driver matches {!r}".format(source, text[:80]))
+                continue
+            if dev_os == "nxos" and source == "ssh":
+                # NX-API may be disabled, the SSH driver works either way
+                dev_os = "nxos_ssh"
+            detection = {"dev_os": dev_os, "source": source, "detected": time.time()}
+            try:
+                write_gzip_json(self._path(hostname), detection)
+            except (IOError, OSError):
+                pass
+            detection["cached"] = False
+            return detection
+        raise DetectionError("; ".join(errors))
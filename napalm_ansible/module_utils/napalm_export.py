@@ -0,0 +1,124 @@
+"""Export of getter results to files read by tools outside of Ansible."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+msgpack_found = False
+try:
+    import msgpack
+
+    msgpack_found = True
+except ImportError:
+    pass
+
+EXPORT_FORMATS = ["jsonl", "msgpack"]
+
+
+class _HashingWriter(object):
+    """File wrapper counting and hashing the bytes written through it."""
+
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+
+def records(hostname, getter, value):
+    """Split a getter result in records.
+
+    Dictionaries give one record per key, lists one record per item and any
+    other value a single record.
+    """
+    base = {"host": hostname, "getter": getter}
+    if isinstance(value, dict):
+        for key in sorted(value):
+            yield dict(base, key=key, value=value[key])
+    elif isinstance(value, list):
+        for item in value:
+            yield dict(base, value=item)
+    else:
+        yield dict(base, value=value)
+
+
+def encode(record, fmt):
+    if fmt == "msgpack":
+        return msgpack.packb(record, default=str, use_bin_type=True)
+    return (json.dumps(record, sort_keys=True, default=str) + "\n").encode("utf-8")
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def shard_path(dest, hostname, getter, fmt="jsonl", compress=False):
+    """Return the path of the shard of a getter of a host."""
+    name = hostname.replace(os.sep, "_") + "." + fmt
+    if compress:
+        name += ".gz"
+    return os.path.join(dest, getter, name)
+
+
+def write_shard(
+    dest, hostname, getter, value, fmt="jsonl", compress=False, check_mode=False
+):
+    """Stream the records of a getter result to its shard.
+
+    The output is deterministic, the shard is only replaced when its content
+    changes. Returns the manifest entry of the shard.
+    """
+    if fmt == "msgpack" and not msgpack_found:
+        raise ImportError("the python module msgpack is required to export msgpack")
+
+    path = shard_path(dest, hostname, getter, fmt, compress)
+    directory = os.path.dirname(path)
+    if not check_mode and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    count = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory if not check_mode else None)
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            writer = _HashingWriter(raw)
+            out = writer
+            if compress:
+                # no timestamp in the header, the same records give the same bytes
+                out = gzip.GzipFile(fileobj=writer, mode="wb", mtime=0)
+            for record in records(hostname, getter, value):
+                out.write(encode(record, fmt))
+                count += 1
+            if compress:
+                out.close()
+        checksum = writer.sha256.hexdigest()
+        changed = not os.path.exists(path) or file_sha256(path) != checksum
+        if changed and not check_mode:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    return {
+        "host": hostname,
+        "getter": getter,
+        "path": path,
+        "format": fmt,
+        "bytes": writer.size,
+        "records": count,
+        "sha256": checksum,
+        "changed": changed,
+    }
@@ -0,0 +1,65 @@
+"""Journal of the work completed by a run, to resume it after an interruption."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import json
+import os
+import time
+
+try:
+    from ansible.module_utils.napalm_cache import state_dir
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import state_dir
+
+
+class JournalError(Exception):
+    """The journal of a host can't be written."""
+
+
+class Journal(object):
+    """Append-only record of the completed work of a run, one file per host.
+
+    Every task only reads and appends to the file of its host, so hosts
+    running in parallel never contend on the same file.
+    """
+
+    def __init__(self, run_id, journal_dir=None):
+        directory = os.path.expanduser(journal_dir or state_dir("journal"))
+        self.run_dir = os.path.join(directory, run_id.replace(os.sep, "_"))
+
+    def _path(self, host):
+        return os.path.join(self.run_dir, host.replace(os.sep, "_") + ".jsonl")
+
+    def completed(self, host):
+        """Return the entries recorded for host, the last one of each item wins."""
+        entries = {}
+        try:
+            with open(self._path(host)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut short by the interruption
+                        continue
+                    entries[entry["item"]] = entry
+        except (IOError, OSError):
+            pass
+        return entries
+
+    def record(self, host, item, sha256, **extra):
+        """Append a completed item of host to the journal, raise JournalError."""
+        entry = dict(extra, item=item, sha256=sha256, time=time.time())
+        line = json.dumps(entry, sort_keys=True, default=str) + "\n"
+        try:
+            if not os.path.isdir(self.run_dir):
+                try:
+                    os.makedirs(self.run_dir)
+                except OSError:
+                    if not os.path.isdir(self.run_dir):
+                        raise
+            # a single write in append mode, entries are never interleaved
+            with open(self._path(host), "a") as f:
+                f.write(line)
+        except (IOError, OSError) as e:
+            raise JournalError(
+                "cannot write the journal {}: {}".format(self._path(host), e)
+            )
@@ -0,0 +1,137 @@
+"""Concurrency and rate limits shared by every fork and run on the controller."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import fcntl
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+try:
+    from ansible.module_utils.napalm_cache import cache_key, state_dir
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import cache_key, state_dir
+
+# argument spec of the items of the limits option
+LIMITS_SPEC = dict(
+    label=dict(type="str", required=True),
+    concurrency=dict(type="int", required=False),
+    rate=dict(type="float", required=False),
+    burst=dict(type="int", required=False),
+    operations=dict(
+        type="list",
+        elements="str",
+        required=False,
+        default=["open"],
+        choices=["open", "commit"],
+    ),
+)
+
+# seconds between two attempts at a busy limit
+POLL_INTERVAL = (0.05, 0.25)
+
+
+class LimitTimeout(Exception):
+    """A limit stayed busy for longer than the timeout."""
+
+
+@contextmanager
+def limited(limiter, operation):
+    """Hold the limits of operation in limiter (if not None) while the block runs."""
+    if limiter is None:
+        yield
+        return
+    with limiter.hold(operation):
+        yield
+
+
+class Limiter(object):
+    """Limits of the operations of the tasks, keyed by label.
+
+    Every limit applies to the tasks giving the same label, whatever their
+    fork or playbook: ``concurrency`` operations at a time, each holding one
+    of as many slot files locked, and ``rate`` operations per second, from a
+    token bucket of ``burst`` tokens kept in a file. Locks are released by
+    the kernel when a task dies, a crashed task never holds a slot.
+    """
+
+    def __init__(self, limits, timeout=300, limiter_dir=None):
+        self.limits = sorted(limits, key=lambda limit: limit["label"])
+        self.timeout = timeout
+        self.limiter_dir = os.path.expanduser(limiter_dir or state_dir("limits"))
+
+    def _path(self, label, suffix):
+        if not os.path.isdir(self.limiter_dir):
+            try:
+                os.makedirs(self.limiter_dir)
+            except OSError:
+                if not os.path.isdir(self.limiter_dir):
+                    raise
+        return os.path.join(self.limiter_dir, cache_key(label) + suffix)
+
+    @contextmanager
+    def hold(self, operation):
+        """Wait for every limit of operation, raise LimitTimeout past the timeout.
+
+        Limits are taken in the order of their labels, so tasks sharing
+        several of them can't deadlock.
+        """
+        deadline = time.monotonic() + self.timeout
+        slots = []
+        try:
+            for limit in self.limits:
+                if operation not in (limit.get("operations") or ["open"]):
+                    continue
+                if limit.get("concurrency"):
+                    slots.append(self._take_slot(limit, deadline))
+                if limit.get("rate"):
+                    self._take_token(limit, deadline)
+            yield
+        finally:
+            for slot in slots:
+                slot.close()
+
+    def _wait(self, label, seconds, deadline):
+        if time.monotonic() + seconds > deadline:
+            raise LimitTimeout(
+                "timed out after {}s waiting for the limit {}".format(
+                    self.timeout, label
+                )
+            )
+        time.sleep(seconds)
+
+    def _take_slot(self, limit, deadline):
+        """Return the open file of a slot of limit, locked until closed."""
+        while True:
+            for index in range(limit["concurrency"]):
+                slot = open(self._path(limit["label"], ".slot{}".format(index)), "a")
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    slot.close()
+                    continue
+                return slot
+            self._wait(limit["label"], random.uniform(*POLL_INTERVAL), deadline)
+
+    def _take_token(self, limit, deadline):
+        rate = limit["rate"]
+        burst = limit.get("burst") or 1
+        while True:
+            with open(self._path(limit["label"], ".bucket"), "a+") as bucket:
+                fcntl.flock(bucket, fcntl.LOCK_EX)
+                bucket.seek(0)
+                try:
+                    state = json.loads(bucket.read())
+                except ValueError:
+                    state = {}
+                now = time.time()
+                tokens = state.get("tokens", burst)
+                tokens += (now - state.get("updated", now)) * rate
+                tokens = min(burst, tokens)
+                if tokens >= 1:
+                    bucket.seek(0)
+                    bucket.truncate()
+                    bucket.write(json.dumps({"tokens": tokens - 1, "updated": now}))
+                    return
+            self._wait(limit["label"], (1 - tokens) / rate, deadline)
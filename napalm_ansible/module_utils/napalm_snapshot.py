@@ -0,0 +1,97 @@
+"""Snapshots of the last result of the getters and structural deltas between them."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import hashlib
+import json
+import os
+import time
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+
+
+def content_hash(value):
+    """sha256 of the canonical JSON serialization of value."""
+    serialized = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def diff(old, new, path=None):
+    """Return the (added, removed, changed) paths from old to new.
+
+    Dictionaries are compared key by key, any other value (lists included) as
+    a whole. Paths are lists of keys, keys of NAPALM results often contain dots.
+    """
+    path = path or []
+    added, removed, changed = [], [], []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new), key=str):
+            if key not in old:
+                added.append({"path": path + [key], "value": new[key]})
+            elif key not in new:
+                removed.append({"path": path + [key], "value": old[key]})
+            else:
+                a, r, c = diff(old[key], new[key], path + [key])
+                added += a
+                removed += r
+                changed += c
+    elif old != new:
+        changed.append({"path": path, "old": old, "new": new})
+    return added, removed, changed
+
+
+def delta(previous, value):
+    """Structural delta of value against the previous snapshot (or None)."""
+    sha256 = content_hash(value)
+    result = {
+        "sha256": sha256,
+        "previous_sha256": previous["sha256"] if previous else None,
+        "added": [],
+        "removed": [],
+        "changed": [],
+    }
+    if previous is None:
+        result["added"].append({"path": [], "value": value})
+    elif previous["sha256"] != sha256:
+        # round-trip through JSON so both sides compare with the same types
+        value = json.loads(json.dumps(value, default=str))
+        added, removed, changed = diff(previous["value"], value)
+        result.update(added=added, removed=removed, changed=changed)
+    return result
+
+
+class SnapshotStore(object):
+    """Last result of every getter, one gzipped JSON file per key."""
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = os.path.expanduser(snapshot_dir or state_dir("snapshots"))
+
+    def _path(self, key):
+        return os.path.join(self.snapshot_dir, key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Return the snapshot (sha256, value and stored time) or None."""
+        try:
+            return read_gzip_json(self._path(key))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, value, sha256=None):
+        snapshot = {
+            "sha256": sha256 or content_hash(value),
+            "stored": time.time(),
+            "value": value,
+        }
+        write_gzip_json(self._path(key), snapshot)
@@ -0,0 +1,146 @@
+"""Time spent by the operations on every host, recorded to plan the next runs."""
+
+from __future__ import absolute_import, unicode_literals, print_function
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        CACHE_SUFFIX,
+        cache_key,
+        read_gzip_json,
+        state_dir,
+        write_gzip_json,
+    )
+
+
+class Deadline(object):
+    """Time budget of a task, new getters are only started while it lasts."""
+
+    def __init__(self, seconds):
+        self.end = time.monotonic() + seconds if seconds else None
+
+    def allows(self, cost=None):
+        """Whether a getter expected to take cost seconds (if known) can start."""
+        if self.end is None:
+            return True
+        remaining = self.end - time.monotonic()
+        return remaining > 0 and (cost is None or cost <= remaining)
+
+
+@contextmanager
+def timed(stats, operation):
+    """Record the seconds the block takes as operation in stats (if not None).
+
+    A failing block is recorded too, and saved right away as the task is
+    about to fail.
+    """
+    if stats is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    except Exception:
+        stats.record(operation, time.monotonic() - start)
+        stats.save()
+        raise
+    stats.record(operation, time.monotonic() - start)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+class OperationStats(object):
+    """Seconds every operation (open, getters, commit...) of a host takes.
+
+    Keeps a moving average and the last samples of each operation, one file
+    per host. The file is replaced whole, without a lock: when several writers
+    share it (targets of one task, playbooks sharing the state directory) the
+    last one wins and the samples of the others are lost.
+    """
+
+    # weight of the last duration in the average
+    alpha = 0.3
+    # samples kept per operation for the percentiles
+    samples = 20
+    # samples needed before a timeout is derived from them
+    min_samples = 3
+    # timeouts are this many times the 95th percentile (or the average)
+    headroom = 3
+    min_timeout = 10
+
+    def __init__(self, hostname, stats_dir=None):
+        directory = os.path.expanduser(stats_dir or state_dir("stats"))
+        self.path = os.path.join(directory, cache_key(hostname) + CACHE_SUFFIX)
+        try:
+            self.stats = read_gzip_json(self.path)
+        except (IOError, OSError, ValueError):
+            self.stats = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def get(self, operation):
+        """Average seconds of operation, None if it never ran."""
+        entry = self.stats.get(operation)
+        return entry["average"] if entry else None
+
+    def order(self, items, key=lambda item: item):
+        """Sort items cheapest operation first, operations that never ran go first."""
+
+        def cost(item):
+            average = self.get(key(item))
+            return (average is not None, average or 0.0)
+
+        return sorted(items, key=cost)
+
+    def record(self, operation, elapsed):
+        with self._lock:
+            entry = self.stats.get(operation)
+            if entry is None:
+                entry = self.stats[operation] = {"average": elapsed, "count": 0}
+            else:
+                entry["average"] += self.alpha * (elapsed - entry["average"])
+            entry["count"] += 1
+            recent = entry.get("samples", []) + [round(elapsed, 3)]
+            entry["samples"] = recent[-self.samples :]
+            self._dirty = True
+
+    def timeout(self, operations, default):
+        """Timeout in seconds covering every one of operations.
+
+        Derived from the 95th percentile (or the average, if higher) of the
+        recent samples, never longer than default. default is used as soon as
+        an operation doesn't have enough samples yet.
+        """
+        timeouts = []
+        for operation in operations:
+            entry = self.stats.get(operation)
+            if entry is None or len(entry.get("samples", [])) < self.min_samples:
+                return default
+            expected = max(percentile(entry["samples"], 0.95), entry["average"])
+            timeouts.append(expected * self.headroom)
+        return min(default, int(math.ceil(max(timeouts + [self.min_timeout]))))
+
+    def save(self):
+        """Persist the stats, recording them is only an optimization."""
+        if not self._dirty:
+            return
+        try:
+            write_gzip_json(self.path, self.stats)
+        except (IOError, OSError):
+            pass
@@ -21,6 +21,7 @@ description:
     - "Executes network device CLI commands and returns response using NAPALM"
 requirements:
     - napalm
+extends_documentation_fragment: napalm
 options:
     hostname:
         description:
@@ -40,7 +41,9 @@ options:
         required: True
     dev_os:
         description:
-          - OS of the device
+          - "OS of the device, C(auto) detects it from the SNMP sysDescr, the SSH banner or
+            the HTTPS landing page of the device (see C(detect)) and remembers it for
+            the next runs"
         required: False
     provider:
         description:
@@ -86,6 +89,16 @@ results:
         "show snmp chassis": "Chassis: 1234\n",
         "show version": "Arista vEOS\nHardware version:    \nSerial number:       \nSystem MAC address:  0800.27c3.5f28\n\nSoftware image version: 4.17.5M\nArchitecture:           i386\nInternal build version: 4.17.5M-4414219.4175M\nInternal build ID:      d02143c6-e42b-4fc3-99b6-97063bddb6b8\n\nUptime:                 1 hour and 21 minutes\nTotal memory:           1893416 kB\nFree memory:            956488 kB\n\n"  # noqa
     }'
+detection:
+    description: How the dev_os was detected, with dev_os auto
+    returned: when dev_os is auto
+    type: dict
+    sample: {"dev_os": "eos", "source": "ssh", "cached": false, "detected": 1760000000.0}
+credential:
+    description: Name (or username) of the credentials that opened the session
+    returned: when credentials is set
+    type: str
+    sample: "regional-aaa"
 """
 
 napalm_found = False
@@ -97,10 +110,35 @@ try:
 except ImportError:
     pass
 
+try:
+    from ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+
+try:
+    from ansible.module_utils.napalm_stats import timed
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import timed
+
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            CONNECTION_SPEC,
             hostname=dict(type="str", required=False, aliases=["host"]),
             username=dict(type="str", required=False),
             password=dict(type="str", required=False, no_log=True),
@@ -148,6 +186,9 @@ def main():
     args = module.params["args"]
 
     argument_check = {"hostname": hostname, "username": username, "dev_os": dev_os}
+    if module.params["credentials"]:
+        # every credential has its own username
+        argument_check.pop("username")
     for key, val in argument_check.items():
         if val is None:
             module.fail_json(msg=str(key) + " is required")
@@ -157,34 +198,49 @@ def main():
     else:
         optional_args = module.params["optional_args"]
 
+    detection = detect_dev_os(module, hostname)
+    if detection is not None:
+        dev_os = detection["dev_os"]
+
     try:
         network_driver = get_network_driver(dev_os)
     except ModuleImportError as e:
         module.fail_json(msg="Failed to import napalm driver: " + str(e))
 
-    try:
-        device = network_driver(
-            hostname=hostname,
-            username=username,
-            password=password,
-            timeout=timeout,
-            optional_args=optional_args,
-        )
-        device.open()
-    except Exception as e:
-        module.fail_json(msg="cannot connect to device: " + str(e))
+    credentials = open_credentials(module, hostname)
+    stats = open_stats(module, hostname)
+    timeout = task_timeout(module, stats, ["cli"])
+    device = open_device(
+        module,
+        network_driver,
+        stats=stats,
+        credentials=credentials,
+        hostname=hostname,
+        username=username,
+        password=password,
+        timeout=timeout,
+        optional_args=optional_args,
+    )
 
     try:
-        cli_response = device.cli(**args)
+        with timed(stats, "cli"):
+            cli_response = device.cli(**args)
     except Exception as e:
         module.fail_json(msg="{}".format(e))
+    if stats is not None:
+        stats.save()
 
     try:
         device.close()
     except Exception as e:
         module.fail_json(msg="cannot close device connection: " + str(e))
 
-    module.exit_json(changed=False, cli_results=cli_response)
+    results = {"changed": False, "cli_results": cli_response}
+    if credentials is not None:
+        results["credential"] = credentials.used
+    if detection is not None:
+        results["detection"] = detection
+    module.exit_json(**results)
 
 
 if __name__ == "__main__":
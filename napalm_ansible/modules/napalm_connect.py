@@ -0,0 +1,223 @@
+"""
+This file is part of Ansible
+
+Ansible is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Ansible is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import unicode_literals, print_function
+import time
+from ansible.module_utils.basic import AnsibleModule
+
+
+# FIX for Ansible 2.8 moving this function and making it private
+# greatly simplified for napalm-ansible's use
+def return_values(obj):
+    """Return native stringified values from datastructures.
+
+    For use with removing sensitive values pre-jsonification."""
+    yield str(obj)
+
+
+DOCUMENTATION = """
+---
+module: napalm_connect
+author: "napalm-ansible contributors"
+short_description: "Opens the persistent NAPALM session of the devices ahead of the tasks"
+description:
+    - "Opens the driver session held by the C(napalm) connection plugin, or by the
+      broker, before the first task needing it. The session is opened in a thread
+      of the connection (or of the broker) and the task returns at once, so the
+      forks move on to the next hosts while the devices authenticate in parallel;
+      the next napalm_* task of a host waits for its session (and fails if it
+      could not be opened)."
+    - "Only useful with C(connection: napalm) or C(broker). Keep
+      C(ansible_connect_timeout) (or the idle timeout of the broker) longer than the
+      time between this task and the next one of a host, an idle session is closed
+      after it."
+options:
+    wait:
+        description:
+          - Wait for the session to be open and fail the task if it can't be, instead
+            of opening it in the background
+        required: False
+        default: False
+        choices: [True, False]
+    broker:
+        description:
+          - "Path of the Unix socket of a napalm-ansible-broker to open the session in,
+            when not using C(connection: napalm)"
+        required: False
+    hostname:
+        description:
+          - IP or FQDN of the device you want to connect to, with C(broker)
+        required: False
+    username:
+        description:
+          - Username, with C(broker)
+        required: False
+    password:
+        description:
+          - Password, with C(broker)
+        required: False
+    dev_os:
+        description:
+          - OS of the device, with C(broker)
+        required: False
+    timeout:
+        description:
+          - Time in seconds to wait for the device to respond, with C(broker)
+        required: False
+        default: 60
+    optional_args:
+        description:
+          - Dictionary of additional arguments passed to underlying driver, with
+            C(broker)
+        required: False
+        default: None
+    provider:
+        description:
+          - "Dictionary which acts as a collection of arguments used to define the
+            characteristics of how to connect to the device, with C(broker). With
+            C(connection: napalm) the session takes its settings from the connection
+            variables."
+        required: False
+"""
+
+EXAMPLES = """
+- hosts: routers
+  connection: napalm
+  gather_facts: False
+  strategy: free
+  vars:
+    ansible_connect_timeout: 600
+  tasks:
+    - name: open the sessions of every router at the start of the play
+      napalm_connect:
+
+    - napalm_get_facts:
+        filter: facts
+
+- name: check the session opens
+  napalm_connect:
+    wait: True
+
+- name: have the broker open the session for the next playbooks too
+  napalm_connect:
+    broker: ~/.ansible/napalm/broker.sock
+    provider: "{{ napalm_provider }}"
+"""
+
+RETURN = """
+changed:
+    description: ALWAYS RETURNS FALSE
+    returned: always
+    type: bool
+    sample: False
+session_open:
+    description: Whether the session is open, false while it is being opened in the background
+    returned: always
+    type: bool
+    sample: True
+elapsed:
+    description: Seconds the task waited for the session
+    returned: always
+    type: float
+    sample: 0.002
+"""
+
+try:
+    from ansible.module_utils.napalm_common import PersistentDevice
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import PersistentDevice
+
+try:
+    from ansible.module_utils.napalm_broker import BrokerDevice
+except ImportError:
+    from napalm_ansible.module_utils.napalm_broker import BrokerDevice
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            wait=dict(type="bool", required=False, default=False),
+            broker=dict(type="str", required=False),
+            hostname=dict(type="str", required=False, aliases=["host"]),
+            username=dict(type="str", required=False),
+            password=dict(type="str", required=False, no_log=True),
+            dev_os=dict(type="str", required=False),
+            timeout=dict(type="int", required=False, default=60),
+            optional_args=dict(required=False, type="dict", default=None),
+            provider=dict(type="dict", required=False),
+        ),
+        supports_check_mode=True,
+    )
+
+    provider = module.params["provider"] or {}
+    for param in ["password", "secret"]:
+        if provider.get(param):
+            module.no_log_values.update(return_values(provider[param]))
+        if provider.get("optional_args") and provider["optional_args"].get(param):
+            module.no_log_values.update(
+                return_values(provider["optional_args"].get(param))
+            )
+        if module.params.get("optional_args") and module.params["optional_args"].get(
+            param
+        ):
+            module.no_log_values.update(
+                return_values(module.params["optional_args"].get(param))
+            )
+
+    # allow host or hostname
+    provider["hostname"] = provider.get("hostname", None) or provider.get("host", None)
+    # allow local params to override provider
+    for param, pvalue in provider.items():
+        if module.params.get(param) is not False:
+            module.params[param] = module.params.get(param) or pvalue
+
+    socket_path = getattr(module, "_socket_path", None)
+    if socket_path:
+        device = PersistentDevice(socket_path)
+    elif module.params["broker"]:
+        for key in ("hostname", "username", "dev_os"):
+            if module.params[key] is None:
+                module.fail_json(msg=key + " is required")
+        device = BrokerDevice(
+            module.params["broker"],
+            module.params["dev_os"],
+            hostname=module.params["hostname"],
+            username=module.params["username"],
+            password=module.params["password"],
+            timeout=module.params["timeout"],
+            optional_args=module.params["optional_args"],
+        )
+    else:
+        module.fail_json(
+            msg="napalm_connect needs connection: napalm or a broker to keep the "
+            "session open"
+        )
+
+    start = time.monotonic()
+    try:
+        session_open = device.open_session(wait=module.params["wait"])
+    except Exception as e:
+        module.fail_json(msg=str(e))
+
+    module.exit_json(
+        changed=False,
+        session_open=session_open,
+        elapsed=round(time.monotonic() - start, 3),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ You should have received a copy of the GNU General Public License
 along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 """
 from __future__ import unicode_literals, print_function
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from ansible.module_utils.basic import AnsibleModule
 
 
@@ -40,6 +43,7 @@ description:
     - "Gathers facts from a network device via the Python module napalm"
 requirements:
     - napalm
+extends_documentation_fragment: napalm
 options:
     hostname:
         description:
@@ -55,7 +59,9 @@ options:
         required: False
     dev_os:
         description:
-          - OS of the device
+          - "OS of the device, C(auto) detects it from the SNMP sysDescr, the SSH banner or
+            the HTTPS landing page of the device (see C(detect)) and remembers it for
+            the next runs"
         required: False
     provider:
         description:
@@ -94,6 +100,189 @@ options:
         description:
             - dictionary of kwargs arguments to pass to the filter. The outer key is the name of
               the getter (same as the filter)
+            - "The value can also be a list of kwargs, the getter is then called once per item
+              over the same session (at the same time with C(parallel_getters)) and its result
+              is a dictionary keyed by the arguments, e.g. C(destination=8.8.8.8). An empty
+              list fails the task"
+        required: False
+        default: None
+    parallel_getters:
+        description:
+            - "Run the getters in C(filter) at the same time instead of one after the other.
+              Drivers whose transport handles concurrent requests (nxos/NX-API) share the
+              session, other drivers open up to C(getter_workers) - 1 extra sessions."
+        required: False
+        default: False
+        choices: [True, False]
+    getter_workers:
+        description:
+            - Maximum number of getters running at the same time with C(parallel_getters)
+        required: False
+        default: 4
+    targets:
+        description:
+            - "List of devices to collect the getters from in this single task, instead of
+              the task's host. Each item takes hostname (required), username, password,
+              dev_os (C(auto) detects it per device), timeout and optional_args; missing
+              values are taken from the task (or provider). The devices are handled on a pool of C(target_workers)
+              threads and the results are returned in C(target_results), nothing is
+              added to C(ansible_facts)."
+        required: False
+        default: None
+    target_workers:
+        description:
+            - Maximum number of C(targets) collected at the same time (in-flight limit)
+        required: False
+        default: 20
+    target_engine:
+        description:
+            - "How the C(targets) are scheduled. C(threads) uses a pool of
+              C(target_workers) threads. C(asyncio) drives the targets from one
+              event loop with C(target_workers) in flight."
+            - "C(asyncio) only helps callables that are coroutines. The NAPALM
+              drivers are synchronous, they still run in a pool of
+              C(target_workers) threads, so C(asyncio) is not faster than
+              C(threads) with them and adds an event loop."
+        required: False
+        default: threads
+        choices: ['threads', 'asyncio']
+    cache_ttl:
+        description:
+            - "Seconds a getter result is served from the on-disk cache instead of the
+              device. The cache is keyed by hostname, dev_os, getter and its C(args).
+              When every getter is fresh no session is opened. 0 disables the cache."
+        required: False
+        default: 0
+    cache_getter_ttl:
+        description:
+            - Dictionary of getter name to cache TTL in seconds, overriding C(cache_ttl)
+        required: False
+        default: None
+    cache_dir:
+        description:
+            - "Directory of the cache, shared by every playbook using it. Defaults to
+              C(facts_cache) in C($NAPALM_ANSIBLE_STATE_DIR) or C(~/.ansible/napalm)."
+        required: False
+        default: None
+    cache_max_size:
+        description:
+            - "Size in bytes of the cache directory, the least recently used results
+              are evicted past it. 0 means no limit."
+        required: False
+        default: 104857600
+    select:
+        description:
+            - "Dictionary of getter name to the list of fields to keep in its result,
+              everything else is dropped before the result leaves the module. Fields
+              are dot separated paths, C(*) matches any key and lists are filtered
+              item by item, e.g. C(*.is_up) keeps the state of every interface."
+        required: False
+        default: None
+    dest:
+        description:
+            - "Directory the getter results are exported to instead of being returned.
+              Every getter of every host is written to C(dest/<getter>/<hostname>.<format>),
+              one record per key of the result (per item for lists), and the task
+              only returns the C(manifest) of the files. Nothing is added to
+              C(ansible_facts)."
+        required: False
+        default: None
+    dest_format:
+        description:
+            - Format of the files in C(dest), JSON Lines or msgpack (requires the msgpack
+              python module)
+        required: False
+        default: jsonl
+        choices: ['jsonl', 'msgpack']
+    dest_compress:
+        description:
+            - Compress the files in C(dest) with gzip
+        required: False
+        default: False
+        choices: [True, False]
+    delta:
+        description:
+            - "Return only what changed since the previous run. The last result of every
+              getter is kept as a snapshot per host (and C(args) and C(select)), and the
+              task returns C(deltas) with the added, removed and changed paths and
+              the content hash of each getter instead of C(ansible_facts)."
+        required: False
+        default: False
+        choices: [True, False]
+    delta_in_facts:
+        description:
+            - With C(delta), set the deltas as C(napalm_<getter>) in C(ansible_facts)
+              instead of returning C(deltas)
+        required: False
+        default: False
+        choices: [True, False]
+    partial_results:
+        description:
+            - "Don't fail the task when a getter fails. The getters that succeeded are
+              returned as usual and the failed ones in C(failed_getters), with the error,
+              the time spent and the number of attempts."
+        required: False
+        default: False
+        choices: [True, False]
+    getter_retries:
+        description:
+            - "Number of times a failed getter is retried, in the same session, before
+              it fails the task (or is reported in C(failed_getters))"
+        required: False
+        default: 0
+    resume:
+        description:
+            - "Id of the run, e.g. the date of a fleet collection. Every getter collected
+              is recorded with its result in the journal of the run, and the getters
+              already recorded for the host are returned from it instead of being
+              collected again, so a rerun after an interruption only collects what is
+              left."
+        required: False
+        default: None
+    journal_dir:
+        description:
+            - "Directory of the C(resume) journals. Defaults to C(journal) in
+              C($NAPALM_ANSIBLE_STATE_DIR) or C(~/.ansible/napalm)."
+        required: False
+        default: None
+    inject_facts:
+        description:
+            - "Set the results in C(ansible_facts), as C(napalm_<getter>) plus every key
+              of the facts getter as C(napalm_<fact>). When false the results are only
+              returned under C(facts), keyed by getter, to be used with C(register),
+              and don't stay in hostvars for the rest of the play."
+        required: False
+        default: True
+        choices: [True, False]
+    probe:
+        description:
+            - "Cheap getter telling whether the device changed since the last run, e.g.
+              the C(facts) uptime or the last commit of the configuration. Takes the
+              C(getter), its C(args) and the C(select) fields compared from its result.
+              When the probe result is the same as on the previous run, the getters in
+              C(probe_gated) are served from their last snapshot instead of the device."
+        required: False
+        default: None
+    probe_gated:
+        description:
+            - Getters served from their snapshot while the C(probe) result doesn't change
+        required: False
+        default: ['config', 'lldp_neighbors_detail', 'bgp_neighbors_detail']
+    deadline:
+        description:
+            - "Budget in seconds of the whole task (of every device with C(targets)),
+              on top of the per-operation C(timeout). The getters run cheapest first,
+              by the average time they took on the previous runs of the host, and no
+              getter is started once the budget is spent or when it is expected to
+              outlast what is left of it. The task returns what finished and the
+              getters that were not started in C(skipped_getters). 0 means no
+              deadline."
+        required: False
+        default: 0
+    snapshot_dir:
+        description:
+            - "Directory of the C(delta) and C(probe) snapshots. Defaults to C(snapshots) in
+              C($NAPALM_ANSIBLE_STATE_DIR) or C(~/.ansible/napalm)."
         required: False
         default: None
 """
@@ -133,6 +322,117 @@ EXAMPLES = """
             protocol: static
             destination: 8.8.8.8
 
+- name: run the getters at the same time
+  napalm_get_facts:
+    provider: "{{ nxos_provider }}"
+    parallel_getters: True
+    filter:
+      - "interfaces"
+      - "interfaces_ip"
+      - "lldp_neighbors_detail"
+      - "bgp_neighbors"
+
+- name: collect the whole fleet from one task
+  napalm_get_facts:
+    username: "{{ user }}"
+    password: "{{ password }}"
+    dev_os: eos
+    filter: ['facts', 'interfaces']
+    targets:
+      - hostname: 10.0.0.1
+      - hostname: 10.0.0.2
+      - hostname: 10.0.0.3
+        dev_os: junos
+    target_workers: 50
+  run_once: True
+  register: fleet
+
+- name: get the state and speed of the interfaces only
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['facts', 'interfaces', 'route_to']
+    args:
+      route_to:
+        destination: 8.8.8.8
+    select:
+      facts: ['hostname', 'os_version']
+      interfaces: ['*.is_up', '*.speed']
+      route_to: ['*.protocol', '*.next_hop']
+
+- name: export the counters of the fleet for the analytics jobs
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['interfaces_counters']
+    dest: /data/napalm
+    dest_compress: True
+
+- name: get whatever the device answers, retrying the getters that fail once
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['facts', 'interfaces', 'bgp_neighbors', 'lldp_neighbors_detail']
+    partial_results: True
+    getter_retries: 1
+  register: result
+
+- name: collect the fleet, a rerun only collects what the previous one didn't
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['facts', 'interfaces', 'lldp_neighbors']
+    resume: "inventory-{{ '%Y-%m-%d' | strftime }}"
+
+- name: get the routes without keeping them in hostvars
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['route_to']
+    args:
+      route_to:
+        destination: 0.0.0.0/0
+    inject_facts: False
+  register: default_route
+
+- name: get what changed in the interfaces since the last run
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['interfaces']
+    delta: True
+  register: interfaces_delta
+
+- name: check the routes to many prefixes over a single session
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['route_to']
+    args:
+      route_to:
+        - destination: 8.8.8.0/24
+        - destination: 1.1.1.0/24
+          protocol: bgp
+    parallel_getters: True
+  register: routes
+  # routes.ansible_facts.napalm_route_to['destination=8.8.8.0/24']
+
+- name: only get the configuration and neighbors again after a commit or a reboot
+  napalm_get_facts:
+    provider: "{{ junos_provider }}"
+    filter: ['facts', 'config', 'lldp_neighbors_detail']
+    probe:
+      getter: facts
+      select: ['uptime', 'os_version']
+  register: result
+
+- name: return within 2 minutes whatever the state of the device
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['facts', 'interfaces', 'bgp_neighbors', 'lldp_neighbors_detail']
+    deadline: 120
+  register: result
+
+- name: get facts, reusing results less than 10 minutes old
+  napalm_get_facts:
+    provider: "{{ eos_provider }}"
+    filter: ['facts', 'interfaces', 'lldp_neighbors']
+    cache_ttl: 600
+    cache_getter_ttl:
+      lldp_neighbors: 60
 """
 
 RETURN = """
@@ -145,6 +445,91 @@ ansible_facts:
     description: "Facts gathered on the device provided via C(ansible_facts)"
     returned: certain keys are returned depending on filter
     type: dict
+target_results:
+    description: "Result of every device in C(targets), keyed by hostname. Holds the
+                  getter results under C(facts) (and C(not_implemented)), or C(failed)
+                  and C(msg) when the device could not be collected, and
+                  C(circuit_open) when it was not contacted because of C(circuit_breaker)"
+    returned: when targets is set
+    type: dict
+    sample: {
+        "10.0.0.1": {"failed": False, "facts": {"facts": {"hostname": "sw1"}}},
+        "10.0.0.2": {"failed": True, "msg": "cannot connect to device: timed out"}
+    }
+failed_targets:
+    description: Hostnames in C(targets) that could not be collected
+    returned: when targets is set
+    type: list
+cached_getters:
+    description: Getters served from the cache instead of the device
+    returned: when the cache is enabled
+    type: list
+manifest:
+    description: "Files written in C(dest), one entry per getter with the host, getter,
+                  path, format, bytes, records, sha256 of the file and whether it changed.
+                  With C(targets) the manifest of every device is in its C(target_results)"
+    returned: when dest is set
+    type: list
+    sample: [{
+        "host": "sw1", "getter": "interfaces", "path": "/data/napalm/interfaces/sw1.jsonl.gz",
+        "format": "jsonl", "bytes": 18211, "records": 52, "changed": True,
+        "sha256": "9f2c4b1e6d6a0cbd8d7f4b8e2f1a3b7c5d9e0f1a2b3c4d5e6f708192a3b4c5d6"
+    }]
+probe:
+    description: "sha256 of the C(probe) result, whether it changed since the previous
+                  run and the getters served from their snapshot because it didn't"
+    returned: when probe is set
+    type: dict
+    sample: {"getter": "facts", "sha256": "3e7a0d5c...", "changed": False,
+             "snapshot_getters": ["config", "lldp_neighbors_detail"]}
+timeout:
+    description: Timeout of the driver derived from the history of the host
+    returned: when adaptive_timeout is set
+    type: int
+    sample: 25
+skipped_getters:
+    description: Getters not started because the C(deadline) didn't leave time for them
+    returned: when deadline is set
+    type: list
+resumed_getters:
+    description: Getters returned from the journal of the run
+    returned: when resume is set
+    type: list
+failed_getters:
+    description: Getters that failed, with the error, seconds spent and attempts
+    returned: when partial_results is set
+    type: dict
+    sample: {"bgp_neighbors": {"msg": "cannot retrieve device data: timed out",
+                               "elapsed": 60.012, "attempts": 2}}
+facts:
+    description: Results of the getters keyed by getter name
+    returned: when inject_facts is false
+    type: dict
+    sample: {"facts": {"hostname": "sw1", "vendor": "Arista"}}
+deltas:
+    description: "Delta of every getter against the previous run: sha256 and
+                  previous_sha256 of the result, and the lists of added, removed and
+                  changed paths (lists of keys). On the first run the whole result is
+                  added at the empty path"
+    returned: when delta is set, unless delta_in_facts
+    type: dict
+    sample: {
+        "interfaces": {
+            "sha256": "0c3b5d1e...", "previous_sha256": "6a1f9e7b...",
+            "added": [], "removed": [],
+            "changed": [{"path": ["Ethernet1", "is_up"], "old": True, "new": False}]
+        }
+    }
+detection:
+    description: How the dev_os was detected, with dev_os auto (in C(target_results) for targets)
+    returned: when dev_os is auto
+    type: dict
+    sample: {"dev_os": "eos", "source": "ssh", "cached": false, "detected": 1760000000.0}
+credential:
+    description: Name (or username) of the credentials that opened the session
+    returned: when credentials is set
+    type: str
+    sample: "regional-aaa"
 """
 
 napalm_found = False
@@ -156,10 +541,936 @@ try:
 except ImportError:
     pass
 
+try:
+    from ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        connect_device,
+        detect_dev_os,
+        map_targets,
+        open_breaker,
+        open_credential_store,
+        open_credentials,
+        open_device,
+        open_limiter,
+        PersistentDevice,
+        session_factory,
+        task_timeout,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        connect_device,
+        detect_dev_os,
+        map_targets,
+        open_breaker,
+        open_credential_store,
+        open_credentials,
+        open_device,
+        open_limiter,
+        PersistentDevice,
+        session_factory,
+        task_timeout,
+    )
+
+try:
+    from ansible.module_utils.napalm_breaker import CircuitOpen
+except ImportError:
+    from napalm_ansible.module_utils.napalm_breaker import CircuitOpen
+
+try:
+    from ansible.module_utils.napalm_broker import BrokerDevice
+except ImportError:
+    from napalm_ansible.module_utils.napalm_broker import BrokerDevice
+
+try:
+    from ansible.module_utils.napalm_cache import cache_key, FactsCache
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import cache_key, FactsCache
+
+try:
+    from ansible.module_utils.napalm_capabilities import driver_capabilities
+except ImportError:
+    from napalm_ansible.module_utils.napalm_capabilities import driver_capabilities
+
+try:
+    from ansible.module_utils.napalm_detect import DetectionError, Detector
+except ImportError:
+    from napalm_ansible.module_utils.napalm_detect import DetectionError, Detector
+
+try:
+    from ansible.module_utils.napalm_credentials import CredentialRotation
+except ImportError:
+    from napalm_ansible.module_utils.napalm_credentials import CredentialRotation
+
+try:
+    from ansible.module_utils.napalm_stats import Deadline, OperationStats
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import Deadline, OperationStats
+
+try:
+    from ansible.module_utils.napalm_journal import Journal, JournalError
+except ImportError:
+    from napalm_ansible.module_utils.napalm_journal import Journal, JournalError
+
+try:
+    from ansible.module_utils.napalm_snapshot import (
+        content_hash,
+        delta,
+        SnapshotStore,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_snapshot import (
+        content_hash,
+        delta,
+        SnapshotStore,
+    )
+
+try:
+    from ansible.module_utils.napalm_export import (
+        EXPORT_FORMATS,
+        msgpack_found,
+        write_shard,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_export import (
+        EXPORT_FORMATS,
+        msgpack_found,
+        write_shard,
+    )
+
+# Drivers whose transport can serve concurrent requests over a single session
+SHARED_SESSION_DRIVERS = ["nxos"]
+
+
+class GetterError(Exception):
+    """A getter failed, the message is the error reported by the task."""
+
+
+class DeadlineExceeded(Exception):
+    """A getter was not started, the deadline of the task didn't allow it."""
+
+
+def not_supported(getter, dev_os):
+    return GetterError(
+        "The filter {} is not supported in napalm-{} [get_{}()]".format(
+            getter, dev_os, getter
+        )
+    )
+
+
+def check_filter(network_driver, dev_os, filter_list, ignore_notimplemented):
+    """Split filter_list into (runnable, not implemented) getters of the driver.
+
+    Uses the capability matrix of the driver, so getters it doesn't implement
+    are known before connecting. Raises GetterError for unknown getters, and
+    for not implemented ones unless ignore_notimplemented.
+    """
+    capabilities = driver_capabilities(network_driver, dev_os)
+    getters = capabilities["getters"]
+    # Allow NX-OS checkpoint file to be retrieved via Ansible for use with replace config
+    getters = getters + ["get_checkpoint_file"]
+
+    runnable = []
+    implementation_errors = []
+    for getter in filter_list:
+        getter_function = "get_{}".format(getter)
+        if getter_function not in getters:
+            raise GetterError("filter not recognized: " + getter)
+        if getter_function not in capabilities["not_implemented"]:
+            runnable.append(getter)
+        elif ignore_notimplemented:
+            implementation_errors.append(getter)
+        else:
+            raise not_supported(getter, dev_os)
+    return runnable, implementation_errors
+
+
+def getter_ttls(filter_list, cache_ttl, cache_getter_ttl):
+    """Return the cache TTL of every getter in filter_list."""
+    cache_getter_ttl = cache_getter_ttl or {}
+    return dict(
+        (getter, cache_getter_ttl.get(getter, cache_ttl)) for getter in filter_list
+    )
+
+
+def getter_cache_key(hostname, dev_os, getter, args):
+    return cache_key(hostname, dev_os, getter, args.get(getter, {}))
+
+
+def load_cached(cache, ttls, hostname, dev_os, filter_list, args):
+    """Return (facts served from the cache, getters to run on the device)."""
+    facts = {}
+    stale = []
+    for getter in filter_list:
+        value = None
+        if ttls[getter] > 0:
+            key = getter_cache_key(hostname, dev_os, getter, args)
+            value = cache.get(key, ttls[getter])
+        if value is None:
+            stale.append(getter)
+        else:
+            facts[getter] = value
+    return facts, stale
+
+
+def store_cached(cache, ttls, hostname, dev_os, facts, args):
+    """Cache the getters with a TTL, returns a warning if they can't be written.
+
+    Like reading it, writing the cache never fails the task.
+    """
+    try:
+        for getter, value in facts.items():
+            if ttls[getter] > 0:
+                cache.set(getter_cache_key(hostname, dev_os, getter, args), value)
+    except (IOError, OSError) as e:
+        return "cannot write the getter cache: " + str(e)
+    return None
+
+
+def project(value, paths):
+    """Keep only the fields of value matching one of the dot separated paths.
+
+    ``*`` matches any key and lists are projected item by item.
+    """
+    if isinstance(value, list):
+        return [project(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    selected = {}
+    for path in paths:
+        key, _, rest = path.partition(".")
+        for name in value if key == "*" else [key]:
+            if name in value:
+                selected.setdefault(name, []).append(rest)
+
+    result = {}
+    for name, rests in selected.items():
+        if "" in rests:
+            result[name] = value[name]
+        else:
+            result[name] = project(value[name], rests)
+    return result
+
+
+def select_fields(facts, select):
+    """Project the getter results having an entry in select."""
+    for getter, paths in (select or {}).items():
+        if getter in facts:
+            facts[getter] = project(facts[getter], paths)
+    return facts
+
+
+def journal_item(getter, args):
+    return "getter:{}:{}".format(getter, cache_key(args.get(getter, {})))
+
+
+def load_journal(journal, hostname, filter_list, args):
+    """Return (facts completed in the journal, getters left to run)."""
+    completed = journal.completed(hostname)
+    facts = {}
+    remaining = []
+    for getter in filter_list:
+        entry = completed.get(journal_item(getter, args))
+        if entry is None:
+            remaining.append(getter)
+        else:
+            facts[getter] = entry["value"]
+    return facts, remaining
+
+
+def journal_recorder(journal, hostname, args):
+    """Return the on_result callback recording the getters in the journal."""
+    if journal is None:
+        return None
+
+    def record(getter, value):
+        item = journal_item(getter, args)
+        journal.record(hostname, item, content_hash(value), value=value)
+
+    return record
+
+
+class ProbeGate(object):
+    """Serve the expensive getters from their snapshot while a cheap probe is unchanged.
+
+    The probe result is only stored once the gated getters were collected, a
+    failed run never makes the next one trust stale snapshots.
+    """
+
+    def __init__(self, probe, gated, snapshots, check_mode=False):
+        self.getter = probe["getter"]
+        self.args = probe.get("args") or {}
+        self.select = probe.get("select")
+        self.gated = gated or []
+        self.snapshots = snapshots
+        self.check_mode = check_mode
+
+    def _getter_key(self, hostname, getter, args):
+        return cache_key("probe_gated", hostname, getter, args.get(getter, {}))
+
+    def check(self, device, hostname, filter_list, args):
+        """Run the probe, returns (state, facts served from snapshots, getters to run)."""
+        result, error, _ = call_getter(device, self.getter, self.args)
+        if error is not None:
+            raise GetterError(
+                "[probe {}] cannot retrieve device data: ".format(self.getter)
+                + str(error)
+            )
+        value = project(result, self.select) if self.select else result
+        key = cache_key("probe", hostname, self.getter, self.args, self.select)
+        sha256 = content_hash(value)
+        previous = self.snapshots.get(key)
+        state = {
+            "key": key,
+            "sha256": sha256,
+            "value": value,
+            "changed": previous is None or previous["sha256"] != sha256,
+        }
+
+        facts = {}
+        remaining = []
+        for getter in filter_list:
+            snapshot = None
+            if not state["changed"] and getter in self.gated:
+                snapshot = self.snapshots.get(self._getter_key(hostname, getter, args))
+            if snapshot is None:
+                remaining.append(getter)
+            else:
+                facts[getter] = snapshot["value"]
+        return state, facts, remaining
+
+    def report(self, state, facts):
+        return {
+            "getter": self.getter,
+            "sha256": state["sha256"],
+            "changed": state["changed"],
+            "snapshot_getters": sorted(facts),
+        }
+
+    def store(self, state, hostname, facts, args, failed, stale=()):
+        """Snapshot the gated getters collected, then the probe if none failed.
+
+        stale are the getters not collected from the device in this run
+        (skipped by the deadline, served by the cache or the journal), the
+        probe is not stored while one of them is gated.
+        """
+        if self.check_mode:
+            return
+        for getter in self.gated:
+            if getter in facts:
+                key = self._getter_key(hostname, getter, args)
+                self.snapshots.set(key, facts[getter])
+        if failed or set(self.gated) & set(stale):
+            return
+        if state["changed"]:
+            self.snapshots.set(state["key"], state["value"], state["sha256"])
+
+
+def args_key(kwargs):
+    """Key of the result of one of the argument sets of a getter."""
+    return ",".join("{}={}".format(key, kwargs[key]) for key in sorted(kwargs))
+
+
+def getter_calls(filter_list, args):
+    """Return the (getter, key, kwargs) calls running the getters in filter_list.
+
+    The key is None for getters taking a single argument set, and the args_key
+    of every argument set for getters given a list of them.
+    """
+    calls = []
+    for getter in filter_list:
+        getter_args = args.get(getter, {})
+        if getter_args == []:
+            # no call at all, the getter would be missing from the results
+            raise GetterError(
+                "the args of {} are an empty list, give one item per call".format(
+                    getter
+                )
+            )
+        if isinstance(getter_args, list):
+            calls.extend((getter, args_key(kwargs), kwargs) for kwargs in getter_args)
+        else:
+            calls.append((getter, None, getter_args))
+    return calls
+
+
+def call_getter(device, getter, kwargs):
+    """Run a single getter, returns a (result, exception, elapsed) tuple."""
+    getter_function = "get_{}".format(getter)
+    if getter_function == "get_checkpoint_file":
+        getter_function = "_get_checkpoint_file"
+    start = time.monotonic()
+    try:
+        result = getattr(device, getter_function)(**kwargs)
+        return result, None, time.monotonic() - start
+    except Exception as e:
+        return None, e, time.monotonic() - start
+
+
+def call_getters_parallel(device, calls, workers, new_session=None, expired=None):
+    """Run the getter calls on a thread pool, returns (call, outcome) pairs in order.
+
+    Every thread shares ``device`` unless ``new_session`` is given, in which case
+    the first thread uses ``device`` and each other thread opens its own session.
+    Calls whose getter is ``expired`` when a thread picks them are not started.
+    """
+    local = threading.local()
+    spare = [device]
+    extra = []
+    lock = threading.Lock()
+
+    def session():
+        if new_session is None:
+            return device
+        if not hasattr(local, "device"):
+            with lock:
+                current = spare.pop() if spare else None
+            if current is None:
+                current = new_session()
+                with lock:
+                    extra.append(current)
+            local.device = current
+        return local.device
+
+    def run(call):
+        getter, _, kwargs = call
+        if expired is not None and expired(getter):
+            return None, DeadlineExceeded(), 0.0
+        try:
+            current = session()
+        except Exception as e:
+            return None, e, 0.0
+        return call_getter(current, getter, kwargs)
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(calls))) as executor:
+            outcomes = list(executor.map(run, calls))
+    finally:
+        for current in extra:
+            try:
+                current.close()
+            except Exception:
+                pass
+    return list(zip(calls, outcomes))
+
+
+def collect_facts(
+    device,
+    dev_os,
+    filter_list,
+    args,
+    ignore_notimplemented,
+    parallel_getters=False,
+    getter_workers=1,
+    new_session=None,
+    partial_results=False,
+    getter_retries=0,
+    on_result=None,
+    deadline=None,
+    costs=None,
+):
+    """Run the getters in filter_list, returns (facts, not_implemented, failed, skipped).
+
+    A getter given a list of argument sets is called once per set, its result is
+    keyed by the args_key of each set. A failing call is retried getter_retries
+    times on the main session. If it still fails its getter is reported in
+    failed with partial_results, otherwise GetterError is raised. on_result is
+    called with every getter that succeeds, as soon as it does.
+
+    With costs the cheapest getters run first and the time of every call is
+    recorded. Getters the deadline doesn't leave time for are not started
+    and are returned in skipped.
+    """
+    calls = getter_calls(filter_list, args)
+    if costs is not None:
+        calls = costs.order(calls, key=lambda call: call[0])
+
+    def expired(getter):
+        if deadline is None:
+            return False
+        return not deadline.allows(costs.get(getter) if costs is not None else None)
+
+    if parallel_getters and getter_workers > 1 and len(calls) > 1:
+        # a persistent connection or the broker hold a single session per device,
+        # calls are serialized on it
+        shared = dev_os in SHARED_SESSION_DRIVERS or isinstance(
+            device, (PersistentDevice, BrokerDevice)
+        )
+        outcomes = call_getters_parallel(
+            device,
+            calls,
+            getter_workers,
+            new_session=None if shared else new_session,
+            expired=expired,
+        )
+    else:
+        # evaluated lazily, so the first error stops the remaining getters
+        # (unless partial_results) and the deadline is checked before each one
+        outcomes = (
+            (
+                call,
+                (
+                    (None, DeadlineExceeded(), 0.0)
+                    if expired(call[0])
+                    else call_getter(device, call[0], call[2])
+                ),
+            )
+            for call in calls
+        )
+
+    facts = {}
+    pending = {}
+    for getter, key, _ in calls:
+        pending[getter] = pending.get(getter, 0) + 1
+        if key is not None:
+            facts[getter] = {}
+    implementation_errors = []
+    failed_getters = {}
+    skipped_getters = []
+    for (getter, key, kwargs), (result, error, elapsed) in outcomes:
+        attempts = 1
+        while (
+            error is not None
+            and not isinstance(error, (NotImplementedError, DeadlineExceeded))
+            and attempts <= getter_retries
+            and not expired(getter)
+        ):
+            result, error, retry_elapsed = call_getter(device, getter, kwargs)
+            elapsed += retry_elapsed
+            attempts += 1
+        if costs is not None and not isinstance(
+            error, (NotImplementedError, DeadlineExceeded)
+        ):
+            costs.record(getter, elapsed / attempts)
+
+        pending[getter] -= 1
+        if (
+            getter in failed_getters
+            or getter in implementation_errors
+            or getter in skipped_getters
+        ):
+            continue
+        label = getter if key is None else "{} {}".format(getter, key)
+        if error is None:
+            if key is None:
+                facts[getter] = result
+            else:
+                facts[getter][key] = result
+            if on_result is not None and not pending[getter]:
+                on_result(getter, facts[getter])
+        elif isinstance(error, DeadlineExceeded):
+            # the results of the other argument sets are dropped with it
+            facts.pop(getter, None)
+            skipped_getters.append(getter)
+        elif isinstance(error, NotImplementedError):
+            facts.pop(getter, None)
+            if ignore_notimplemented:
+                implementation_errors.append(getter)
+            else:
+                raise not_supported(getter, dev_os)
+        elif partial_results:
+            facts.pop(getter, None)
+            failed_getters[getter] = {
+                "msg": "cannot retrieve device data: " + str(error),
+                "elapsed": round(elapsed, 3),
+                "attempts": attempts,
+            }
+            if key is not None:
+                failed_getters[getter]["args"] = kwargs
+        else:
+            raise GetterError(
+                "[{}] cannot retrieve device data: ".format(label) + str(error)
+            )
+    return facts, implementation_errors, failed_getters, skipped_getters
+
+
+def collect_target(
+    target,
+    network_driver,
+    filter_list,
+    args,
+    ignore_notimplemented,
+    parallel_getters,
+    getter_workers,
+    cache=None,
+    ttls=None,
+    partial_results=False,
+    getter_retries=0,
+    journal=None,
+    probe=None,
+    deadline=0,
+    connect_timeout=0,
+    breaker=None,
+    adaptive_timeout=False,
+    broker=None,
+    limiter=None,
+    credentials=None,
+    credential_store=None,
+):
+    """Collect the getters from one of the targets, returns its result."""
+    budget = Deadline(deadline) if deadline else None
+    # with credentials every credential has its own username
+    required = ("dev_os",) if credential_store is not None else ("username", "dev_os")
+    for key in required:
+        if target[key] is None:
+            return {"failed": True, "msg": key + " is required"}
+    if isinstance(network_driver, Exception):
+        return {
+            "failed": True,
+            "msg": "Failed to import napalm driver: " + str(network_driver),
+        }
+
+    try:
+        filter_list, not_implemented = check_filter(
+            network_driver, target["dev_os"], filter_list, ignore_notimplemented
+        )
+    except GetterError as e:
+        return {"failed": True, "msg": str(e)}
+
+    result = {"failed": False, "facts": {}}
+    if ignore_notimplemented:
+        result["not_implemented"] = sorted(not_implemented)
+    if journal is not None:
+        resumed, filter_list = load_journal(
+            journal, target["hostname"], filter_list, args
+        )
+        result["facts"].update(resumed)
+        result["resumed_getters"] = sorted(resumed)
+    if cache is not None:
+        cached, filter_list = load_cached(
+            cache, ttls, target["hostname"], target["dev_os"], filter_list, args
+        )
+        result["facts"].update(cached)
+        result["cached_getters"] = sorted(cached)
+    if partial_results:
+        result["failed_getters"] = {}
+    if deadline:
+        result["skipped_getters"] = []
+    if not filter_list:
+        # nothing left to run on the device
+        return result
+
+    stats = None
+    timeout = target["timeout"]
+    if deadline or adaptive_timeout:
+        stats = OperationStats(target["hostname"])
+    if adaptive_timeout:
+        timeout = stats.timeout(["open"] + filter_list, timeout)
+        result["timeout"] = timeout
+
+    rotation = None
+    if credential_store is not None:
+        rotation = CredentialRotation(credentials, credential_store, target["hostname"])
+    new_session = session_factory(
+        network_driver,
+        broker,
+        target["dev_os"],
+        rotation,
+        hostname=target["hostname"],
+        username=target["username"],
+        password=target["password"],
+        timeout=timeout,
+        optional_args=target["optional_args"] or {},
+    )
+    try:
+        device = connect_device(
+            new_session,
+            target["hostname"],
+            target["dev_os"],
+            target["optional_args"],
+            connect_timeout,
+            breaker,
+            stats,
+            limiter,
+        )
+    except CircuitOpen as e:
+        return {
+            "failed": True,
+            "circuit_open": True,
+            "msg": "cannot connect to device: " + str(e),
+        }
+    except Exception as e:
+        return {"failed": True, "msg": "cannot connect to device: " + str(e)}
+    if rotation is not None:
+        result["credential"] = rotation.used
+
+    def new_getter_session():
+        # the sessions of the parallel getters go through the limits too
+        return connect_device(
+            new_session,
+            target["hostname"],
+            target["dev_os"],
+            target["optional_args"],
+            connect_timeout,
+            breaker,
+            stats,
+            limiter,
+        )
+
+    served = {}
+    try:
+        if probe is not None:
+            probe_state, served, filter_list = probe.check(
+                device, target["hostname"], filter_list, args
+            )
+        facts, implementation_errors, failed_getters, skipped = collect_facts(
+            device,
+            target["dev_os"],
+            filter_list,
+            args,
+            ignore_notimplemented,
+            parallel_getters,
+            getter_workers,
+            new_getter_session,
+            partial_results,
+            getter_retries,
+            journal_recorder(journal, target["hostname"], args),
+            budget,
+            stats,
+        )
+    except (GetterError, JournalError) as e:
+        if stats is not None:
+            stats.save()
+        return {"failed": True, "msg": str(e)}
+    finally:
+        try:
+            device.close()
+        except Exception:
+            pass
+
+    if cache is not None:
+        result["cache_warning"] = store_cached(
+            cache, ttls, target["hostname"], target["dev_os"], facts, args
+        )
+    if probe is not None:
+        try:
+            probe.store(
+                probe_state,
+                target["hostname"],
+                facts,
+                args,
+                failed_getters,
+                list(skipped)
+                + result.get("resumed_getters", [])
+                + result.get("cached_getters", []),
+            )
+        except (IOError, OSError) as e:
+            return {"failed": True, "msg": "cannot write results: " + str(e)}
+        result["probe"] = probe.report(probe_state, served)
+        facts.update(served)
+    result["facts"].update(facts)
+    if ignore_notimplemented:
+        result["not_implemented"] = sorted(not_implemented + implementation_errors)
+    if partial_results:
+        result["failed_getters"] = failed_getters
+    if stats is not None:
+        stats.save()
+    if deadline:
+        result["skipped_getters"] = sorted(skipped)
+    return result
+
+
+def export_facts(module, hostname, facts):
+    """Write the getter results of a host under dest, returns the manifest."""
+    return [
+        write_shard(
+            module.params["dest"],
+            hostname,
+            getter,
+            facts[getter],
+            module.params["dest_format"],
+            module.params["dest_compress"],
+            module.check_mode,
+        )
+        for getter in sorted(facts)
+    ]
+
+
+def open_journal(module):
+    if not module.params["resume"]:
+        return None
+    return Journal(module.params["resume"], module.params["journal_dir"])
+
+
+def open_snapshots(module):
+    if not module.params["delta"]:
+        return None
+    return SnapshotStore(module.params["snapshot_dir"])
+
+
+def open_probe(module):
+    if not module.params["probe"]:
+        return None
+    return ProbeGate(
+        module.params["probe"],
+        module.params["probe_gated"],
+        SnapshotStore(module.params["snapshot_dir"]),
+        module.check_mode,
+    )
+
+
+def compute_deltas(module, snapshots, hostname, facts):
+    """Return the delta of every getter against its snapshot and update them.
+
+    Snapshots are keyed by the getter arguments and selected fields too, so
+    tasks asking for different data don't see each other's results as changes.
+    """
+    args = module.params["args"] or {}
+    select = module.params["select"] or {}
+    deltas = {}
+    for getter in sorted(facts):
+        key = cache_key(hostname, getter, args.get(getter, {}), select.get(getter))
+        previous = snapshots.get(key)
+        deltas[getter] = delta(previous, facts[getter])
+        sha256 = deltas[getter]["sha256"]
+        if not module.check_mode and deltas[getter]["previous_sha256"] != sha256:
+            snapshots.set(key, facts[getter], sha256)
+    return deltas
+
+
+def open_cache(module):
+    """Return the FactsCache of the task and the TTL of every getter."""
+    ttls = getter_ttls(
+        module.params["filter"],
+        module.params["cache_ttl"],
+        module.params["cache_getter_ttl"],
+    )
+    if not any(ttl > 0 for ttl in ttls.values()):
+        return None, ttls
+    return FactsCache(module.params["cache_dir"], module.params["cache_max_size"]), ttls
+
+
+def detect_targets(module, targets):
+    """Detect the dev_os of the targets with dev_os auto, returns them by hostname.
+
+    The detection of a target that failed is its DetectionError.
+    """
+    auto = [target for target in targets if target["dev_os"] == "auto"]
+    if not auto:
+        return {}
+    detector = Detector(module.params["detect"])
+
+    def detect(target):
+        try:
+            return detector.detect_dev_os(target["hostname"])
+        except DetectionError as e:
+            return e
+
+    detections = {}
+    outcomes = map_targets(detect, auto, module.params["target_workers"])
+    for target, detection in zip(auto, outcomes):
+        detections[target["hostname"]] = detection
+        if not isinstance(detection, Exception):
+            target["dev_os"] = detection["dev_os"]
+    return detections
+
+
+def collect_targets(module, defaults):
+    """Collect the getters from every device in targets on a thread pool."""
+    targets = []
+    for target in module.params["targets"]:
+        for key, value in defaults.items():
+            if target.get(key) is None:
+                target[key] = value
+        targets.append(target)
+
+    detections = detect_targets(module, targets)
+
+    # resolve every driver once, not once per device
+    drivers = {}
+    for dev_os in set(target["dev_os"] for target in targets if target["dev_os"]):
+        if dev_os == "auto":
+            # its detection failed
+            continue
+        try:
+            drivers[dev_os] = get_network_driver(dev_os)
+        except ModuleImportError as e:
+            drivers[dev_os] = e
+
+    cache, ttls = open_cache(module)
+    snapshots = open_snapshots(module)
+    journal = open_journal(module)
+    probe = open_probe(module)
+    breaker = open_breaker(module)
+    limiter = open_limiter(module)
+    credential_store = open_credential_store(module)
+
+    def run(target):
+        detection = detections.get(target["hostname"])
+        if isinstance(detection, Exception):
+            return {
+                "failed": True,
+                "msg": "cannot detect the dev_os of the device: " + str(detection),
+            }
+        result = collect_target(
+            target,
+            drivers.get(target["dev_os"]),
+            module.params["filter"],
+            module.params["args"] or {},
+            module.params["ignore_notimplemented"],
+            module.params["parallel_getters"],
+            module.params["getter_workers"],
+            cache,
+            ttls,
+            module.params["partial_results"],
+            module.params["getter_retries"],
+            journal,
+            probe,
+            module.params["deadline"],
+            module.params["connect_timeout"],
+            breaker,
+            module.params["adaptive_timeout"],
+            module.params["broker"],
+            limiter,
+            module.params["credentials"],
+            credential_store,
+        )
+        if detection is not None:
+            result["detection"] = detection
+        warning = result.pop("cache_warning", None)
+        if warning is not None:
+            module.warn("{}: {}".format(target["hostname"], warning))
+        if result["failed"]:
+            return result
+        facts = select_fields(result.pop("facts"), module.params["select"])
+        try:
+            if module.params["delta"]:
+                result["deltas"] = compute_deltas(
+                    module, snapshots, target["hostname"], facts
+                )
+            if module.params["dest"]:
+                result["manifest"] = export_facts(module, target["hostname"], facts)
+        except (IOError, OSError) as e:
+            return {"failed": True, "msg": "cannot write results: " + str(e)}
+        if not (module.params["delta"] or module.params["dest"]):
+            result["facts"] = facts
+        return result
+
+    outcomes = map_targets(
+        run, targets, module.params["target_workers"], module.params["target_engine"]
+    )
+
+    target_results = {}
+    for target, result in zip(targets, outcomes):
+        target_results[target["hostname"]] = result
+    failed_targets = sorted(
+        hostname for hostname, result in target_results.items() if result["failed"]
+    )
+    results = {"target_results": target_results, "failed_targets": failed_targets}
+    if module.params["dest"]:
+        results["changed"] = any(
+            shard["changed"]
+            for result in outcomes
+            for shard in result.get("manifest", [])
+        )
+    return results
+
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            CONNECTION_SPEC,
             hostname=dict(type="str", required=False, aliases=["host"]),
             username=dict(type="str", required=False),
             password=dict(type="str", required=False, no_log=True),
@@ -170,12 +1481,76 @@ def main():
             args=dict(type="dict", required=False, default=None),
             optional_args=dict(type="dict", required=False, default=None),
             filter=dict(type="list", required=False, default=["facts"]),
+            parallel_getters=dict(type="bool", required=False, default=False),
+            getter_workers=dict(type="int", required=False, default=4),
+            targets=dict(
+                type="list",
+                elements="dict",
+                required=False,
+                default=None,
+                options=dict(
+                    hostname=dict(type="str", required=True, aliases=["host"]),
+                    username=dict(type="str", required=False),
+                    password=dict(type="str", required=False, no_log=True),
+                    dev_os=dict(type="str", required=False),
+                    timeout=dict(type="int", required=False),
+                    optional_args=dict(type="dict", required=False),
+                ),
+            ),
+            target_workers=dict(type="int", required=False, default=20),
+            target_engine=dict(
+                type="str",
+                required=False,
+                default="threads",
+                choices=["threads", "asyncio"],
+            ),
+            cache_ttl=dict(type="int", required=False, default=0),
+            cache_getter_ttl=dict(type="dict", required=False, default=None),
+            cache_dir=dict(type="path", required=False, default=None),
+            cache_max_size=dict(type="int", required=False, default=104857600),
+            select=dict(type="dict", required=False, default=None),
+            dest=dict(type="path", required=False, default=None),
+            dest_format=dict(
+                type="str", required=False, default="jsonl", choices=EXPORT_FORMATS
+            ),
+            dest_compress=dict(type="bool", required=False, default=False),
+            delta=dict(type="bool", required=False, default=False),
+            delta_in_facts=dict(type="bool", required=False, default=False),
+            snapshot_dir=dict(type="path", required=False, default=None),
+            inject_facts=dict(type="bool", required=False, default=True),
+            partial_results=dict(type="bool", required=False, default=False),
+            getter_retries=dict(type="int", required=False, default=0),
+            resume=dict(type="str", required=False, default=None),
+            journal_dir=dict(type="path", required=False, default=None),
+            probe=dict(
+                type="dict",
+                required=False,
+                default=None,
+                options=dict(
+                    getter=dict(type="str", required=True),
+                    args=dict(type="dict", required=False),
+                    select=dict(type="list", elements="str", required=False),
+                ),
+            ),
+            probe_gated=dict(
+                type="list",
+                elements="str",
+                required=False,
+                default=["config", "lldp_neighbors_detail", "bgp_neighbors_detail"],
+            ),
+            deadline=dict(type="int", required=False, default=0),
         ),
         supports_check_mode=True,
     )
+    # the budget covers the whole task, connecting included
+    deadline = (
+        Deadline(module.params["deadline"]) if module.params["deadline"] else None
+    )
 
     if not napalm_found:
         module.fail_json(msg="the python module napalm is required")
+    if module.params["dest_format"] == "msgpack" and not msgpack_found:
+        module.fail_json(msg="the python module msgpack is required for dest_format")
 
     provider = module.params["provider"] or {}
 
@@ -209,9 +1584,25 @@ def main():
     filter_list = module.params["filter"]
     args = module.params["args"] or {}
     ignore_notimplemented = module.params["ignore_notimplemented"]
-    implementation_errors = []
+    parallel_getters = module.params["parallel_getters"]
+    getter_workers = module.params["getter_workers"]
+
+    if module.params["targets"]:
+        defaults = {
+            "username": username,
+            "password": password,
+            "dev_os": dev_os,
+            "timeout": timeout,
+            "optional_args": module.params["optional_args"],
+        }
+        results = collect_targets(module, defaults)
+        results.setdefault("changed", False)
+        module.exit_json(**results)
 
     argument_check = {"hostname": hostname, "username": username, "dev_os": dev_os}
+    if module.params["credentials"]:
+        # every credential has its own username
+        argument_check.pop("username")
     for key, val in argument_check.items():
         if val is None:
             module.fail_json(msg=str(key) + " is required")
@@ -221,77 +1612,204 @@ def main():
     else:
         optional_args = module.params["optional_args"]
 
+    detection = detect_dev_os(module, hostname)
+    if detection is not None:
+        dev_os = detection["dev_os"]
+
     try:
         network_driver = get_network_driver(dev_os)
     except ModuleImportError as e:
         module.fail_json(msg="Failed to import napalm driver: " + str(e))
 
+    # retreive data from device
     try:
-        device = network_driver(
+        filter_list, not_implemented = check_filter(
+            network_driver, dev_os, filter_list, ignore_notimplemented
+        )
+    except GetterError as e:
+        module.fail_json(msg=str(e))
+    skipped = bool(not_implemented)
+
+    journal = open_journal(module)
+    resumed = {}
+    if journal is not None:
+        resumed, filter_list = load_journal(journal, hostname, filter_list, args)
+        skipped = skipped or bool(resumed)
+
+    cache, ttls = open_cache(module)
+    cached = {}
+    if cache is not None:
+        cached, filter_list = load_cached(
+            cache, ttls, hostname, dev_os, filter_list, args
+        )
+        skipped = skipped or bool(cached)
+
+    probe = open_probe(module)
+    probe_state = None
+    served = {}
+    facts = {}
+    implementation_errors = []
+    failed_getters = {}
+    skipped_getters = []
+    stats = None
+    if module.params["adaptive_timeout"] or deadline is not None:
+        stats = OperationStats(hostname)
+    credentials = open_credentials(module, hostname)
+    # no need to connect when the cache or the capabilities answered every getter
+    if filter_list or not skipped:
+        timeout = task_timeout(module, stats, filter_list)
+        device = open_device(
+            module,
+            network_driver,
+            stats=stats,
+            credentials=credentials,
             hostname=hostname,
             username=username,
             password=password,
             timeout=timeout,
             optional_args=optional_args,
         )
-        device.open()
-    except Exception as e:
-        module.fail_json(msg="cannot connect to device: " + str(e))
-
-    # retreive data from device
-    facts = {}
 
-    NAPALM_GETTERS = [
-        getter for getter in dir(network_driver) if getter.startswith("get_")
-    ]
-    # Allow NX-OS checkpoint file to be retrieved via Ansible for use with replace config
-    NAPALM_GETTERS.append("get_checkpoint_file")
+        new_session = session_factory(
+            network_driver,
+            module.params["broker"],
+            dev_os,
+            credentials,
+            hostname=hostname,
+            username=username,
+            password=password,
+            timeout=timeout,
+            optional_args=optional_args,
+        )
+        breaker = open_breaker(module)
+        limiter = open_limiter(module)
 
-    for getter in filter_list:
-        getter_function = "get_{}".format(getter)
-        if getter_function not in NAPALM_GETTERS:
-            module.fail_json(msg="filter not recognized: " + getter)
+        def new_getter_session():
+            # the sessions of the parallel getters go through the limits too
+            return connect_device(
+                new_session,
+                hostname,
+                dev_os,
+                optional_args,
+                module.params["connect_timeout"],
+                breaker,
+                stats,
+                limiter,
+            )
 
+        error = None
         try:
-            if getter_function == "get_checkpoint_file":
-                getter_function = "_get_checkpoint_file"
-            get_func = getattr(device, getter_function)
-            result = get_func(**args.get(getter, {}))
-            facts[getter] = result
-        except NotImplementedError:
-            if ignore_notimplemented:
-                implementation_errors.append(getter)
-            else:
-                module.fail_json(
-                    msg="The filter {} is not supported in napalm-{} [get_{}()]".format(
-                        getter, dev_os, getter
-                    )
+            if probe is not None:
+                probe_state, served, filter_list = probe.check(
+                    device, hostname, filter_list, args
+                )
+            facts, implementation_errors, failed_getters, skipped_getters = (
+                collect_facts(
+                    device,
+                    dev_os,
+                    filter_list,
+                    args,
+                    ignore_notimplemented,
+                    parallel_getters,
+                    getter_workers,
+                    new_getter_session,
+                    module.params["partial_results"],
+                    module.params["getter_retries"],
+                    journal_recorder(journal, hostname, args),
+                    deadline,
+                    stats,
                 )
-        except Exception as e:
-            module.fail_json(
-                msg="[{}] cannot retrieve device data: ".format(getter) + str(e)
             )
+        except (GetterError, JournalError) as e:
+            error = str(e)
+        finally:
+            # closed before failing too, it releases the lease of a broker session
+            try:
+                device.close()
+            except Exception as e:
+                if error is None:
+                    error = "cannot close device connection: " + str(e)
+        if error is not None:
+            if stats is not None:
+                stats.save()
+            module.fail_json(msg=error)
 
-    # close device connection
+        if cache is not None:
+            warning = store_cached(cache, ttls, hostname, dev_os, facts, args)
+            if warning is not None:
+                module.warn(warning)
+        if stats is not None:
+            stats.save()
+        if probe_state is not None:
+            try:
+                probe.store(
+                    probe_state,
+                    hostname,
+                    facts,
+                    args,
+                    failed_getters,
+                    list(skipped_getters) + list(cached) + list(resumed),
+                )
+            except (IOError, OSError) as e:
+                module.fail_json(msg="cannot write results: " + str(e))
+    facts.update(served)
+    facts.update(cached)
+    facts.update(resumed)
+    select_fields(facts, module.params["select"])
+
+    results = {}
+    deltas = None
     try:
-        device.close()
-    except Exception as e:
-        module.fail_json(msg="cannot close device connection: " + str(e))
-
-    new_facts = {}
-    # Prepend all facts with napalm_ for unique namespace
-    for filter_name, filter_value in facts.items():
-        # Make napalm get_facts to be directly accessible as variables
-        if filter_name == "facts":
-            for fact_name, fact_value in filter_value.items():
-                napalm_fact_name = "napalm_" + fact_name
-                new_facts[napalm_fact_name] = fact_value
-        new_filter_name = "napalm_" + filter_name
-        new_facts[new_filter_name] = filter_value
-    results = {"ansible_facts": new_facts}
+        if module.params["delta"]:
+            deltas = compute_deltas(module, open_snapshots(module), hostname, facts)
+        if module.params["dest"]:
+            manifest = export_facts(module, hostname, facts)
+            results["changed"] = any(shard["changed"] for shard in manifest)
+            results["manifest"] = manifest
+    except (IOError, OSError) as e:
+        module.fail_json(msg="cannot write results: " + str(e))
+
+    if deltas is not None:
+        if module.params["delta_in_facts"] and module.params["inject_facts"]:
+            results["ansible_facts"] = dict(
+                ("napalm_" + getter, value) for getter, value in deltas.items()
+            )
+        else:
+            results["deltas"] = deltas
+    elif not module.params["inject_facts"] and not module.params["dest"]:
+        # registered with the task only, nothing is kept in hostvars
+        results["facts"] = facts
+    elif not module.params["dest"]:
+        new_facts = {}
+        # Prepend all facts with napalm_ for unique namespace
+        for filter_name, filter_value in facts.items():
+            # Make napalm get_facts to be directly accessible as variables
+            if filter_name == "facts":
+                for fact_name, fact_value in filter_value.items():
+                    napalm_fact_name = "napalm_" + fact_name
+                    new_facts[napalm_fact_name] = fact_value
+            new_filter_name = "napalm_" + filter_name
+            new_facts[new_filter_name] = filter_value
+        results["ansible_facts"] = new_facts
 
     if ignore_notimplemented:
-        results["not_implemented"] = sorted(implementation_errors)
+        results["not_implemented"] = sorted(not_implemented + implementation_errors)
+    if cache is not None:
+        results["cached_getters"] = sorted(cached)
+    if module.params["partial_results"]:
+        results["failed_getters"] = failed_getters
+    if journal is not None:
+        results["resumed_getters"] = sorted(resumed)
+    if probe_state is not None:
+        results["probe"] = probe.report(probe_state, served)
+    if deadline is not None:
+        results["skipped_getters"] = sorted(skipped_getters)
+    if module.params["adaptive_timeout"]:
+        results["timeout"] = timeout
+    if credentials is not None:
+        results["credential"] = credentials.used
+    if detection is not None:
+        results["detection"] = detection
 
     module.exit_json(**results)
 
@@ -19,6 +19,7 @@ You should have received a copy of the GNU General Public License
 along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 """
 from __future__ import unicode_literals, print_function
+import hashlib
 import os.path
 from ansible.module_utils.basic import AnsibleModule
 
@@ -43,6 +44,7 @@ description:
        OS supported by napalm. The old configuration will be replaced or merged with the new one."
 requirements:
     - napalm
+extends_documentation_fragment: napalm
 options:
     hostname:
         description:
@@ -64,7 +66,9 @@ options:
         required: False
     dev_os:
         description:
-          - OS of the device
+          - "OS of the device, C(auto) detects it from the SNMP sysDescr, the SSH banner or
+            the HTTPS landing page of the device (see C(detect)) and remembers it for
+            the next runs"
         required: False
     timeout:
         description:
@@ -122,6 +126,21 @@ options:
             - Store a backup of candidate config from device prior to a commit.
         default: None
         required: False
+    resume:
+        description:
+            - "Id of the run. The archive of the running config and the committed config
+              are recorded in the journal of the run; when the task is rerun with the
+              same id an archive still matching the journal is not retrieved again,
+              and a config already committed is not installed again (the device is not
+              contacted)."
+        default: None
+        required: False
+    journal_dir:
+        description:
+            - "Directory of the C(resume) journals. Defaults to C(journal) in
+              C($NAPALM_ANSIBLE_STATE_DIR) or C(~/.ansible/napalm)."
+        default: None
+        required: False
 """
 
 EXAMPLES = """
@@ -149,6 +168,14 @@ EXAMPLES = """
     replace_config: '{{ replace_config }}'
     get_diffs: True
     diff_file: '../compiled/{{ inventory_hostname }}/diff'
+
+- name: Archive the running config of the fleet, resuming an interrupted run
+  napalm_install_config:
+    provider: "{{ ios_provider }}"
+    config_file: '../compiled/{{ inventory_hostname }}/running.conf'
+    commit_changes: False
+    archive_file: '../archive/{{ inventory_hostname }}.conf'
+    resume: 'archive-2020-06-01'
 """
 
 RETURN = """
@@ -164,6 +191,26 @@ diff:
     sample: {
         'prepared': "[edit system]\n-  host-name lab-testing;\n+  host-name lab;",
     }
+resumed:
+    description: Steps skipped because the journal of the run records them (archive, install)
+    returned: when resume is set
+    type: list
+    sample: ['archive']
+timeout:
+    description: Timeout of the driver derived from the history of the host
+    returned: when adaptive_timeout is set
+    type: int
+    sample: 45
+detection:
+    description: How the dev_os was detected, with dev_os auto
+    returned: when dev_os is auto
+    type: dict
+    sample: {"dev_os": "eos", "source": "ssh", "cached": false, "detected": 1760000000.0}
+credential:
+    description: Name (or username) of the credentials that opened the session
+    returned: when credentials is set
+    type: str
+    sample: "regional-aaa"
 """
 
 napalm_found = False
@@ -175,15 +222,77 @@ try:
 except ImportError:
     pass
 
+try:
+    from ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_limiter,
+        open_stats,
+        task_timeout,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_limiter,
+        open_stats,
+        task_timeout,
+    )
+
+try:
+    from ansible.module_utils.napalm_limiter import limited
+except ImportError:
+    from napalm_ansible.module_utils.napalm_limiter import limited
+
+try:
+    from ansible.module_utils.napalm_stats import timed
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import timed
+
+try:
+    from ansible.module_utils.napalm_journal import Journal, JournalError
+except ImportError:
+    from napalm_ansible.module_utils.napalm_journal import Journal, JournalError
+
 
 def save_to_file(content, filename):
     with open(filename, "w") as f:
         f.write(content)
 
 
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(filename):
+    try:
+        with open(filename) as f:
+            return text_sha256(f.read())
+    except (IOError, OSError):
+        return None
+
+
+def config_sha256(config, config_file, replace_config):
+    """Hash of the config to install, None if it can't be read."""
+    if config_file:
+        try:
+            with open(config_file) as f:
+                config = f.read()
+        except (IOError, OSError):
+            return None
+    if config is None:
+        return None
+    return text_sha256(("replace\n" if replace_config else "merge\n") + config)
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            CONNECTION_SPEC,
             hostname=dict(type="str", required=False, aliases=["host"]),
             username=dict(type="str", required=False),
             password=dict(type="str", required=False, no_log=True),
@@ -199,6 +308,8 @@ def main():
             get_diffs=dict(type="bool", required=False, default=True),
             archive_file=dict(type="str", required=False, default=None),
             candidate_file=dict(type="str", required=False, default=None),
+            resume=dict(type="str", required=False, default=None),
+            journal_dir=dict(type="path", required=False, default=None),
         ),
         supports_check_mode=True,
     )
@@ -244,7 +355,10 @@ def main():
     archive_file = module.params["archive_file"]
     candidate_file = module.params["candidate_file"]
     if config_file:
-        config_file = os.path.expanduser(os.path.expandvars(config_file))
+        # absolute, as a persistent connection loads it from a different working directory
+        config_file = os.path.abspath(
+            os.path.expanduser(os.path.expandvars(config_file))
+        )
     if diff_file:
         diff_file = os.path.expanduser(os.path.expandvars(diff_file))
     if archive_file:
@@ -253,6 +367,9 @@ def main():
         candidate_file = os.path.expanduser(os.path.expandvars(candidate_file))
 
     argument_check = {"hostname": hostname, "username": username, "dev_os": dev_os}
+    if module.params["credentials"]:
+        # every credential has its own username
+        argument_check.pop("username")
     for key, val in argument_check.items():
         if val is None:
             module.fail_json(msg=str(key) + " is required")
@@ -262,47 +379,90 @@ def main():
     else:
         optional_args = module.params["optional_args"]
 
+    detection = detect_dev_os(module, hostname)
+    if detection is not None:
+        dev_os = detection["dev_os"]
+
     try:
         network_driver = get_network_driver(dev_os)
     except ModuleImportError as e:
         module.fail_json(msg="Failed to import napalm driver: " + str(e))
 
-    try:
-        device = network_driver(
-            hostname=hostname,
-            username=username,
-            password=password,
-            timeout=timeout,
-            optional_args=optional_args,
-        )
-        device.open()
-    except Exception as e:
-        module.fail_json(msg="cannot connect to device: " + str(e))
+    journal = None
+    resumed = []
+    if module.params["resume"]:
+        journal = Journal(module.params["resume"], module.params["journal_dir"])
+        completed = journal.completed(hostname)
+        install_sha256 = config_sha256(config, config_file, replace_config)
+        install = completed.get("install")
+        commit = commit_changes and not module.check_mode
+        if commit and install and install["sha256"] == install_sha256:
+            # committed by the interrupted run, nothing left to do on the device
+            module.exit_json(
+                changed=False,
+                diff={"prepared": install.get("diff")},
+                msg=install.get("diff"),
+                resumed=["install"],
+            )
+        archive = completed.get("archive")
+        if archive_file and archive and archive["sha256"] == file_sha256(archive_file):
+            archive_file = None
+            resumed.append("archive")
+
+    credentials = open_credentials(module, hostname)
+    stats = open_stats(module, hostname)
+    operations = ["load_config"]
+    if archive_file is not None or candidate_file is not None:
+        operations.append("config")
+    if get_diffs:
+        operations.append("compare_config")
+    if commit_changes and not module.check_mode:
+        operations.append("commit_config")
+    timeout = task_timeout(module, stats, operations)
+    device = open_device(
+        module,
+        network_driver,
+        stats=stats,
+        credentials=credentials,
+        hostname=hostname,
+        username=username,
+        password=password,
+        timeout=timeout,
+        optional_args=optional_args,
+    )
 
     try:
         if archive_file is not None:
-            running_config = device.get_config(retrieve="running")["running"]
+            with timed(stats, "config"):
+                running_config = device.get_config(retrieve="running")["running"]
             save_to_file(running_config, archive_file)
     except Exception as e:
         module.fail_json(msg="cannot retrieve running config:" + str(e))
-
+    if archive_file is not None and journal is not None:
+        try:
+            journal.record(hostname, "archive", text_sha256(running_config))
+        except JournalError as e:
+            module.fail_json(msg=str(e))
+
+    if not config_file and not config:
+        module.fail_json(msg="You have to specify either config or config_file")
     try:
-        if replace_config and config_file:
-            device.load_replace_candidate(filename=config_file)
-        elif replace_config and config:
-            device.load_replace_candidate(config=config)
-        elif not replace_config and config_file:
-            device.load_merge_candidate(filename=config_file)
-        elif not replace_config and config:
-            device.load_merge_candidate(config=config)
-        else:
-            module.fail_json(msg="You have to specify either config or config_file")
+        with timed(stats, "load_config"):
+            if replace_config and config_file:
+                device.load_replace_candidate(filename=config_file)
+            elif replace_config and config:
+                device.load_replace_candidate(config=config)
+            elif not replace_config and config_file:
+                device.load_merge_candidate(filename=config_file)
+            else:
+                device.load_merge_candidate(config=config)
     except Exception as e:
         module.fail_json(msg="cannot load config: " + str(e))
 
     try:
         if get_diffs:
-            diff = device.compare_config()
+            with timed(stats, "compare_config"):
+                diff = device.compare_config()
             changed = len(diff) > 0
         else:
             changed = True
@@ -314,7 +474,8 @@ def main():
 
     try:
         if candidate_file is not None:
-            running_config = device.get_config(retrieve="candidate")["candidate"]
+            with timed(stats, "config"):
+                running_config = device.get_config(retrieve="candidate")["candidate"]
             save_to_file(running_config, candidate_file)
     except Exception as e:
         module.fail_json(msg="cannot retrieve running config:" + str(e))
@@ -324,16 +485,34 @@ def main():
             device.discard_config()
         else:
             if changed:
-                device.commit_config()
+                with limited(open_limiter(module), "commit"):
+                    with timed(stats, "commit_config"):
+                        device.commit_config()
     except Exception as e:
         module.fail_json(msg="cannot install config: " + str(e))
+    committed = commit_changes and not module.check_mode
+    if committed and journal is not None and install_sha256 is not None:
+        try:
+            journal.record(hostname, "install", install_sha256, diff=diff)
+        except JournalError as e:
+            module.fail_json(msg="config installed, but " + str(e), changed=changed)
 
     try:
         device.close()
     except Exception as e:
         module.fail_json(msg="cannot close device connection: " + str(e))
 
-    module.exit_json(changed=changed, diff={"prepared": diff}, msg=diff)
+    results = {"changed": changed, "diff": {"prepared": diff}, "msg": diff}
+    if journal is not None:
+        results["resumed"] = resumed
+    if stats is not None:
+        stats.save()
+        results["timeout"] = timeout
+    if credentials is not None:
+        results["credential"] = credentials.used
+    if detection is not None:
+        results["detection"] = detection
+    module.exit_json(**results)
 
 
 if __name__ == "__main__":
@@ -36,6 +36,7 @@ description:
     - "This module logs into the device, issues a ping request, and returns the response"
 requirements:
     - napalm
+extends_documentation_fragment: napalm
 options:
     hostname:
         description:
@@ -59,7 +60,9 @@ options:
         required: False
     dev_os:
         description:
-          - OS of the device
+          - "OS of the device, C(auto) detects it from the SNMP sysDescr, the SSH banner or
+            the HTTPS landing page of the device (see C(detect)) and remembers it for
+            the next runs"
         required: False
     timeout:
         description:
@@ -137,6 +140,16 @@ alt_results:
     type: dict
     # when echo request succeeds
     sample: '{"error": "connect: Network is unreachable\n"}}'
+detection:
+    description: How the dev_os was detected, with dev_os auto
+    returned: when dev_os is auto
+    type: dict
+    sample: {"dev_os": "eos", "source": "ssh", "cached": false, "detected": 1760000000.0}
+credential:
+    description: Name (or username) of the credentials that opened the session
+    returned: when credentials is set
+    type: str
+    sample: "regional-aaa"
 """
 
 napalm_found = False
@@ -148,10 +161,35 @@ try:
 except ImportError:
     pass
 
+try:
+    from ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+
+try:
+    from ansible.module_utils.napalm_stats import timed
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import timed
+
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            CONNECTION_SPEC,
             hostname=dict(type="str", required=False, aliases=["host"]),
             username=dict(type="str", required=False),
             password=dict(type="str", required=False, no_log=True),
@@ -215,6 +253,9 @@ def main():
         ping_optional_args.pop("ping_timeout")
 
     argument_check = {"hostname": hostname, "username": username, "dev_os": dev_os}
+    if module.params["credentials"]:
+        # every credential has its own username
+        argument_check.pop("username")
     for key, val in argument_check.items():
         if val is None:
             module.fail_json(msg=str(key) + " is required")
@@ -224,31 +265,46 @@ def main():
     else:
         optional_args = module.params["optional_args"]
 
+    detection = detect_dev_os(module, hostname)
+    if detection is not None:
+        dev_os = detection["dev_os"]
+
     try:
         network_driver = get_network_driver(dev_os)
     except ModuleImportError as e:
         module.fail_json(msg="Failed to import napalm driver: " + str(e))
 
-    try:
-        device = network_driver(
-            hostname=hostname,
-            username=username,
-            password=password,
-            timeout=timeout,
-            optional_args=optional_args,
-        )
-        device.open()
-    except Exception as e:
-        module.fail_json(msg="cannot connect to device: " + str(e))
+    credentials = open_credentials(module, hostname)
+    stats = open_stats(module, hostname)
+    timeout = task_timeout(module, stats, ["ping"])
+    device = open_device(
+        module,
+        network_driver,
+        stats=stats,
+        credentials=credentials,
+        hostname=hostname,
+        username=username,
+        password=password,
+        timeout=timeout,
+        optional_args=optional_args,
+    )
 
-    ping_response = device.ping(destination, **ping_optional_args)
+    with timed(stats, "ping"):
+        ping_response = device.ping(destination, **ping_optional_args)
+    if stats is not None:
+        stats.save()
 
     try:
         device.close()
     except Exception as e:
         module.fail_json(msg="cannot close device connection: " + str(e))
 
-    module.exit_json(changed=False, ping_results=ping_response)
+    results = {"changed": False, "ping_results": ping_response}
+    if credentials is not None:
+        results["credential"] = credentials.used
+    if detection is not None:
+        results["detection"] = detection
+    module.exit_json(**results)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+This file is part of Ansible
+
+Ansible is free software: you can redistribute it and/or modify it
+under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Ansible is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from __future__ import unicode_literals, print_function
+from ansible.module_utils.basic import AnsibleModule
+
+DOCUMENTATION = """
+---
+module: napalm_reachability
+author: "napalm-ansible contributors"
+short_description: "Checks the devices accept TCP connections on their NAPALM transport port"
+description:
+    - "Opens a TCP connection to the transport port of every device at the same time,
+      without instantiating any driver, to find the unreachable devices in a second.
+      Meant to run once at the start of a play, before the tasks connecting to the
+      devices."
+options:
+    hostnames:
+        description:
+          - List of IPs or FQDNs of the devices to check, with the C(dev_os) and
+            C(optional_args) of the task
+        required: False
+        default: None
+    targets:
+        description:
+          - "List of devices to check, on top of C(hostnames). Each item takes
+            hostname (required), dev_os and optional_args (its C(port) or C(transport)
+            give the port); missing values are taken from the task."
+        required: False
+        default: None
+    dev_os:
+        description:
+          - OS of the devices, used to find the default port of their driver
+        required: False
+    optional_args:
+        description:
+          - Dictionary of additional arguments passed to underlying driver
+        required: False
+        default: None
+    connect_timeout:
+        description:
+          - Seconds to wait for the TCP connection to a device
+        required: False
+        default: 3
+    workers:
+        description:
+          - Maximum number of devices checked at the same time
+        required: False
+        default: 50
+"""
+
+EXAMPLES = """
+- name: find the devices that don't answer
+  napalm_reachability:
+    hostnames: "{{ ansible_play_hosts | map('extract', hostvars, 'ansible_host') | list }}"
+    dev_os: junos
+    connect_timeout: 1
+  run_once: True
+  register: result
+
+- name: skip them for the rest of the play
+  meta: end_host
+  when: ansible_host in result.unreachable_hosts
+
+- name: check devices of different platforms
+  napalm_reachability:
+    targets:
+      - hostname: 10.0.0.1
+        dev_os: eos
+      - hostname: 10.0.0.2
+        dev_os: junos
+        optional_args:
+          port: 830
+"""
+
+RETURN = """
+changed:
+    description: ALWAYS RETURNS FALSE
+    returned: always
+    type: bool
+    sample: False
+reachable_hosts:
+    description: Hostnames accepting connections on their port
+    returned: always
+    type: list
+unreachable_hosts:
+    description: Hostnames not accepting connections on their port
+    returned: always
+    type: list
+unknown_hosts:
+    description: Hostnames whose port is unknown (neither given nor known for the driver)
+    returned: always
+    type: list
+reachability:
+    description: "Result of every device keyed by hostname: whether it is reachable,
+                  the port checked and the seconds the connection took, or the error"
+    returned: always
+    type: dict
+    sample: {
+        "10.0.0.1": {"port": 22, "reachable": True, "elapsed": 0.004},
+        "10.0.0.2": {"reachable": False, "msg": "10.0.0.2:22 is unreachable: timed out"}
+    }
+"""
+
+try:
+    from ansible.module_utils.napalm_common import check_reachable, map_targets
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import check_reachable, map_targets
+
+
+def probe(target, connect_timeout):
+    """Check one of the targets, returns its result."""
+    try:
+        port, elapsed = check_reachable(
+            target["hostname"],
+            target["dev_os"],
+            target["optional_args"],
+            connect_timeout,
+        )
+    except OSError as e:
+        return {"reachable": False, "msg": str(e)}
+    if port is None:
+        return {"reachable": None, "msg": "unknown port"}
+    return {"port": port, "reachable": True, "elapsed": round(elapsed, 3)}
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            hostnames=dict(type="list", elements="str", required=False, default=None),
+            targets=dict(
+                type="list",
+                elements="dict",
+                required=False,
+                default=None,
+                options=dict(
+                    hostname=dict(type="str", required=True, aliases=["host"]),
+                    dev_os=dict(type="str", required=False),
+                    optional_args=dict(type="dict", required=False),
+                ),
+            ),
+            dev_os=dict(type="str", required=False),
+            optional_args=dict(type="dict", required=False, default=None),
+            connect_timeout=dict(type="float", required=False, default=3),
+            workers=dict(type="int", required=False, default=50),
+        ),
+        required_one_of=[["hostnames", "targets"]],
+        supports_check_mode=True,
+    )
+
+    targets = [{"hostname": hostname} for hostname in module.params["hostnames"] or []]
+    targets += module.params["targets"] or []
+    for target in targets:
+        for key in ("dev_os", "optional_args"):
+            if target.get(key) is None:
+                target[key] = module.params[key]
+
+    outcomes = map_targets(
+        lambda target: probe(target, module.params["connect_timeout"]),
+        targets,
+        module.params["workers"],
+    )
+
+    reachability = {}
+    for target, result in zip(targets, outcomes):
+        reachability[target["hostname"]] = result
+    hosts = dict((state, []) for state in (True, False, None))
+    for hostname, result in sorted(reachability.items()):
+        hosts[result["reachable"]].append(hostname)
+    # "unreachable" would mark the task's own host unreachable
+    module.exit_json(
+        changed=False,
+        reachability=reachability,
+        reachable_hosts=hosts[True],
+        unreachable_hosts=hosts[False],
+        unknown_hosts=hosts[None],
+    )
+
+
+if __name__ == "__main__":
+    main()
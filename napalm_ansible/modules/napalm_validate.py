@@ -1,15 +1,47 @@
 from __future__ import unicode_literals, print_function
+import os.path
+import time
+import yaml
 from ansible.module_utils.basic import AnsibleModule
 
 napalm_found = False
 try:
     from napalm import get_network_driver
     from napalm.base import ModuleImportError
+    from napalm.base.validate import compare
 
     napalm_found = True
 except ImportError:
     pass
 
+try:
+    from ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_common import (
+        CONNECTION_SPEC,
+        detect_dev_os,
+        open_credentials,
+        open_device,
+        open_stats,
+        task_timeout,
+    )
+
+try:
+    from ansible.module_utils.napalm_stats import Deadline, OperationStats, timed
+except ImportError:
+    from napalm_ansible.module_utils.napalm_stats import (
+        Deadline,
+        OperationStats,
+        timed,
+    )
+
 try:
     import napalm_yang
 except ImportError:
@@ -34,6 +66,7 @@ description:
     - Performs deployment validation via napalm.
 requirements:
     - napalm
+extends_documentation_fragment: napalm
 options:
     hostname:
         description:
@@ -49,7 +82,9 @@ options:
         required: False
     dev_os:
         description:
-          - OS of the device.
+          - "OS of the device, C(auto) detects it from the SNMP sysDescr, the SSH banner or
+            the HTTPS landing page of the device (see C(detect)) and remembers it for
+            the next runs"
         required: False
     provider:
         description:
@@ -84,6 +119,17 @@ options:
         description:
           - dict to load into the YANG object
         required: False
+    deadline:
+        description:
+          - Budget in seconds of the whole task, on top of the per-operation
+            timeout. The getters of the validation file run cheapest first, by
+            the average time they took on the previous runs of the host, and
+            no getter is started once the budget is spent or when it is
+            expected to outlast what is left of it. Those are reported as
+            skipped, and the device as not complying since they didn't run.
+            0 means no deadline.
+        required: False
+        default: 0
 """
 
 EXAMPLES = """
@@ -100,6 +146,12 @@ EXAMPLES = """
     provider: "{{ ios_provider }}"
     validation_file: validate.yml
 
+- name: GET VALIDATION REPORT WITHIN A MINUTE
+  napalm_validate:
+    provider: "{{ ios_provider }}"
+    validation_file: validate.yml
+    deadline: 60
+
 # USING YANG
 - name: Let's gather state of interfaces
   napalm_parse_yang:
@@ -133,11 +185,79 @@ compliance_report:
     description: validation report obtained via napalm.
     returned: always
     type: dict
+timeout:
+    description: Timeout of the driver derived from the history of the host.
+    returned: when adaptive_timeout is set
+    type: int
+skipped_getters:
+    description: Checks not run because the deadline didn't leave time for them.
+    returned: when deadline is set
+    type: list
+detection:
+    description: How the dev_os was detected, with dev_os auto
+    returned: when dev_os is auto
+    type: dict
+    sample: {"dev_os": "eos", "source": "ssh", "cached": false, "detected": 1760000000.0}
+credential:
+    description: Name (or username) of the credentials that opened the session
+    returned: when credentials is set
+    type: str
+    sample: "regional-aaa"
 """
 
 
 def get_compliance_report(module, device):
-    return device.compliance_report(module.params["validation_file"])
+    # absolute, as a persistent connection reads it from a different working directory
+    validation_file = os.path.abspath(module.params["validation_file"])
+    return device.compliance_report(validation_file)
+
+
+def get_budgeted_compliance_report(module, device, deadline, stats):
+    """Same report as napalm's compliance_report, within the deadline of the task.
+
+    The checks run cheapest first, by the time they took in stats, the ones the
+    deadline doesn't leave time for are skipped with the reason "deadline". A
+    device isn't known to comply until they ran, complies is false then.
+    """
+    try:
+        with open(module.params["validation_file"]) as stream:
+            validation_source = yaml.safe_load(stream)
+    except (IOError, yaml.YAMLError) as e:
+        module.fail_json(msg="cannot read validation_file: " + str(e))
+
+    checks = [
+        (getter, expected_results)
+        for validation_check in validation_source
+        for getter, expected_results in validation_check.items()
+        # napalm doesn't validate get_config yet
+        if getter != "get_config"
+    ]
+    report = {}
+    skipped_getters = []
+    for getter, expected_results in stats.order(
+        checks, key=lambda check: check[0][len("get_") :]
+    ):
+        key = expected_results.pop("_name", "") or getter
+        kwargs = expected_results.pop("_kwargs", {})
+        # stats are shared with napalm_get_facts, which names getters without get_
+        name = getter[len("get_") :]
+        if not deadline.allows(stats.get(name)):
+            report[key] = {"skipped": True, "reason": "deadline"}
+            skipped_getters.append(key)
+            continue
+        start = time.monotonic()
+        try:
+            actual_results = getattr(device, getter)(**kwargs)
+        except NotImplementedError:
+            report[key] = {"skipped": True, "reason": "NotImplemented"}
+            continue
+        stats.record(name, time.monotonic() - start)
+        report[key] = compare(expected_results, actual_results)
+
+    complies = all([e.get("complies", True) for e in report.values()])
+    report["skipped"] = [k for k, v in report.items() if v.get("skipped", False)]
+    report["complies"] = complies and not skipped_getters
+    return report, skipped_getters
 
 
 def get_device_instance(module):
@@ -170,32 +290,44 @@ def get_device_instance(module):
     username = module.params["username"]
     dev_os = module.params["dev_os"]
     password = module.params["password"]
-    timeout = module.params["timeout"]
 
     argument_check = {"hostname": hostname, "username": username, "dev_os": dev_os}
+    if module.params["credentials"]:
+        # every credential has its own username
+        argument_check.pop("username")
     for key, val in argument_check.items():
         if val is None:
             module.fail_json(msg=str(key) + " is required")
 
     optional_args = module.params["optional_args"] or {}
 
+    detection = detect_dev_os(module, hostname)
+    if detection is not None:
+        dev_os = detection["dev_os"]
+
     try:
         network_driver = get_network_driver(dev_os)
     except ModuleImportError as e:
         module.fail_json(msg="Failed to import napalm driver: " + str(e))
 
-    try:
-        device = network_driver(
-            hostname=hostname,
-            username=username,
-            password=password,
-            timeout=timeout,
-            optional_args=optional_args,
-        )
-        device.open()
-    except Exception as err:
-        module.fail_json(msg="cannot connect to device: {0}".format(str(err)))
-    return device
+    credentials = open_credentials(module, hostname)
+    stats = open_stats(module, hostname)
+    if stats is None and module.params["deadline"]:
+        # the checks are ordered by the time they took on the previous runs
+        stats = OperationStats(hostname)
+    timeout = task_timeout(module, stats, ["compliance_report"])
+    device = open_device(
+        module,
+        network_driver,
+        stats=stats,
+        credentials=credentials,
+        hostname=hostname,
+        username=username,
+        password=password,
+        timeout=timeout,
+        optional_args=optional_args,
+    )
+    return device, stats, timeout, credentials, detection
 
 
 def get_root_object(models):
@@ -216,6 +348,7 @@ def get_root_object(models):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            CONNECTION_SPEC,
             models=dict(type="list", required=False),
             data=dict(type="dict", required=False),
             hostname=dict(type="str", required=False, aliases=["host"]),
@@ -226,12 +359,16 @@ def main():
             timeout=dict(type="int", required=False, default=60),
             optional_args=dict(type="dict", required=False, default=None),
             validation_file=dict(type="str", required=True),
+            deadline=dict(type="int", required=False, default=0),
         ),
         supports_check_mode=False,
     )
     if not napalm_found:
         module.fail_json(msg="the python module napalm is required")
 
+    stats = None
+    credentials = None
+    detection = None
     if module.params["models"]:
         if not napalm_yang:
             module.fail_json(msg="the python module napalm-yang is required")
@@ -243,8 +380,20 @@ def main():
 
         device.load_dict(module.params["data"])
     else:
-        device = get_device_instance(module)
-    compliance_report = get_compliance_report(module, device)
+        # the budget covers the whole task, connecting included
+        deadline = Deadline(module.params["deadline"])
+        device, stats, timeout, credentials, detection = get_device_instance(module)
+
+    skipped_getters = None
+    with timed(stats, "compliance_report"):
+        if module.params["deadline"] and not module.params["models"]:
+            compliance_report, skipped_getters = get_budgeted_compliance_report(
+                module, device, deadline, stats
+            )
+        else:
+            compliance_report = get_compliance_report(module, device)
+    if stats is not None:
+        stats.save()
 
     if not module.params["models"]:
         # close device connection
@@ -255,8 +404,25 @@ def main():
 
     results = {}
     results["compliance_report"] = compliance_report
+    if skipped_getters is not None:
+        results["skipped_getters"] = skipped_getters
+    if module.params["adaptive_timeout"] and not module.params["models"]:
+        results["timeout"] = timeout
+    if credentials is not None:
+        results["credential"] = credentials.used
+    if detection is not None:
+        results["detection"] = detection
     if not compliance_report["complies"]:
         msg = "Device does not comply with policy"
+        failed_checks = [
+            check
+            for check in compliance_report.values()
+            if isinstance(check, dict) and not check.get("complies", True)
+        ]
+        if skipped_getters and not failed_checks:
+            msg = "Device compliance is unknown, the deadline skipped: " + ", ".join(
+                skipped_getters
+            )
         results["msg"] = msg
         module.fail_json(**results)
 
@@ -2,12 +2,54 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 __metaclass__ = type
 
+import importlib
+import io
+import json
+import pkgutil
+from contextlib import redirect_stdout
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils.parsing.convert_bool import boolean
 from ansible.plugins.action.normal import ActionModule as _ActionModule
+from ansible.utils.display import Display
+from ansible.vars.clean import remove_internal_keys
+
+display = Display()
+
+
+# napalm_* modules by name, imported by the first task that runs them in the process
+PRELOADED_MODULES = None
+
+
+def preload_modules():
+    """Import the napalm_* modules, and napalm with them, once per process.
+
+    Only the tasks with ansible_napalm_import_modules need them, the others
+    don't pay for importing napalm. A module that can't be imported maps to
+    its ImportError.
+    """
+    global PRELOADED_MODULES
+    if PRELOADED_MODULES is not None:
+        return PRELOADED_MODULES
+    try:
+        package = importlib.import_module("napalm_ansible.modules")
+    except ImportError:
+        return {}
+    modules = {}
+    for _, name, _ in pkgutil.iter_modules(package.__path__):
+        try:
+            modules[name] = importlib.import_module(package.__name__ + "." + name)
+        except ImportError as e:
+            modules[name] = e
+    PRELOADED_MODULES = modules
+    return modules
 
 
 class ActionModule(_ActionModule):
     def run(self, tmp=None, task_vars=None):
         pc = self._play_context
+        task_vars = task_vars or {}
 
         if hasattr(pc, "connection_user"):
             # populate provider values with context values if not set
@@ -30,5 +72,88 @@ class ActionModule(_ActionModule):
 
             self._task.args["provider"] = provider
 
+        broker = task_vars.get("ansible_napalm_broker")
+        if broker and "broker" not in self._task.args:
+            provider = self._task.args.get("provider") or {}
+            provider.setdefault("broker", self._templar.template(broker))
+            self._task.args["provider"] = provider
+
+        if boolean(task_vars.get("ansible_napalm_import_modules", False)):
+            module = self._import_module()
+            if module is not None:
+                return self._run_imported_module(module, tmp, task_vars)
+
         result = super(ActionModule, self).run(tmp, task_vars)
         return result
+
+    def _update_module_args(self, module_name, module_args, task_vars, *args, **kw):
+        # the arguments after task_vars depend on the version of Ansible
+        super(ActionModule, self)._update_module_args(
+            module_name, module_args, task_vars, *args, **kw
+        )
+        # the modules reuse the session of the socket they are given, only
+        # the napalm connection holds one, network_cli has a socket too
+        if self._connection.transport != "napalm":
+            module_args["_ansible_socket"] = None
+
+    def _import_module(self):
+        module_name = self._task.action.split(".")[-1]
+        module = preload_modules().get(module_name)
+        if module is None:
+            try:
+                module = importlib.import_module(
+                    "napalm_ansible.modules." + module_name
+                )
+            except ImportError as e:
+                module = e
+        if isinstance(module, ImportError):
+            display.warning(
+                "Cannot import {0} on the controller, running it as a regular "
+                "module: {1}".format(module_name, module)
+            )
+            return None
+        return module
+
+    def _run_imported_module(self, module, tmp, task_vars):
+        """Run the module's main() directly in the worker process.
+
+        This skips building the AnsiballZ payload and starting a new Python
+        interpreter, the result is parsed exactly as for a regular module run.
+        """
+        # skip the normal action, it would execute the module the regular way
+        result = super(_ActionModule, self).run(tmp, task_vars)
+
+        module_name = module.__name__.split(".")[-1]
+        module_args = self._task.args.copy()
+        self._update_module_args(module_name, module_args, task_vars)
+
+        # private globals AnsibleModule reads its arguments from, checked against
+        # ansible-core 2.19, which added _ANSIBLE_PROFILE (the serialization
+        # profile of the arguments), the older releases only have _ANSIBLE_ARGS
+        new_serialization = hasattr(basic, "_ANSIBLE_PROFILE")
+        saved_args = basic._ANSIBLE_ARGS
+        saved_profile = getattr(basic, "_ANSIBLE_PROFILE", None)
+        basic._ANSIBLE_ARGS = to_bytes(json.dumps({"ANSIBLE_MODULE_ARGS": module_args}))
+        if new_serialization:
+            basic._ANSIBLE_PROFILE = "legacy"
+
+        stdout = io.StringIO()
+        try:
+            with redirect_stdout(stdout):
+                module.main()
+        except SystemExit:
+            pass
+        finally:
+            basic._ANSIBLE_ARGS = saved_args
+            if new_serialization:
+                basic._ANSIBLE_PROFILE = saved_profile
+
+        res = {"stdout": stdout.getvalue(), "stderr": "", "rc": 0}
+        if new_serialization:
+            data = self._parse_returned_data(res, "legacy")
+        else:
+            data = self._parse_returned_data(res)
+        remove_internal_keys(data)
+
+        result.update(data)
+        return result
@@ -0,0 +1 @@
+napalm.py
\ No newline at end of file
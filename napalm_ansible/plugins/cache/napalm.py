@@ -0,0 +1,79 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+author: "NAPALM Automation (@napalm-automation)"
+cache: napalm
+short_description: Compressed JSON files with a size limit
+description:
+  - Fact cache storing one gzipped JSON file per host, in the same format as the
+    napalm_get_facts C(cache_dir).
+  - Once the directory grows over C(_max_size) bytes the hosts updated least
+    recently are evicted.
+options:
+  _uri:
+    required: True
+    description:
+      - Path in which the cache plugin will save the files
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_CONNECTION
+    ini:
+      - key: fact_caching_connection
+        section: defaults
+    type: path
+  _prefix:
+    description: User defined prefix to use when creating the files
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_PREFIX
+    ini:
+      - key: fact_caching_prefix
+        section: defaults
+  _timeout:
+    default: 86400
+    description: Expiration timeout for the cache plugin data
+    env:
+      - name: ANSIBLE_CACHE_PLUGIN_TIMEOUT
+    ini:
+      - key: fact_caching_timeout
+        section: defaults
+    type: integer
+  _max_size:
+    default: 104857600
+    description: Size in bytes of the cache directory, 0 means no limit
+    env:
+      - name: NAPALM_ANSIBLE_CACHE_MAX_SIZE
+    ini:
+      - key: fact_caching_max_size
+        section: napalm
+    type: integer
+"""
+
+from ansible.plugins.cache import BaseFileCacheModule
+
+try:
+    from ansible.module_utils.napalm_cache import (
+        evict_lru,
+        read_gzip_json,
+        write_gzip_json,
+    )
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import (
+        evict_lru,
+        read_gzip_json,
+        write_gzip_json,
+    )
+
+
+class CacheModule(BaseFileCacheModule):
+    """A caching module backed by gzipped JSON files."""
+
+    def _load(self, filepath):
+        return read_gzip_json(filepath)
+
+    def _dump(self, value, filepath):
+        write_gzip_json(filepath, value)
+
+    def set(self, key, value):
+        super(CacheModule, self).set(key, value)
+        evict_lru(self._cache_dir, self.get_option("_max_size"), suffix="")
@@ -0,0 +1,221 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+author: "NAPALM Automation (@napalm-automation)"
+connection: napalm
+short_description: Persistent NAPALM driver session for the napalm_* modules
+description:
+  - Opens the NAPALM driver for a host once and keeps it open for the rest of the
+    playbook, so consecutive napalm_* tasks reuse the same device session instead of
+    reconnecting in every task.
+  - The driver is selected with C(ansible_network_os), the same value as the modules'
+    C(dev_os).
+  - The session can be opened ahead of the first task with the C(napalm_connect)
+    module, in the background of the connection so many hosts connect at once.
+requirements:
+  - napalm
+options:
+  host:
+    description:
+      - IP or FQDN of the device you want to connect to. Defaults to the remote address
+        of the play context.
+    vars:
+      - name: ansible_host
+  port:
+    type: int
+    description:
+      - Port passed to the driver through optional_args. The driver default is used
+        when not set.
+    ini:
+      - section: defaults
+        key: remote_port
+    env:
+      - name: ANSIBLE_REMOTE_PORT
+    vars:
+      - name: ansible_port
+  remote_user:
+    description:
+      - Username
+    ini:
+      - section: defaults
+        key: remote_user
+    env:
+      - name: ANSIBLE_REMOTE_USER
+    vars:
+      - name: ansible_user
+  password:
+    description:
+      - Password
+    vars:
+      - name: ansible_password
+      - name: ansible_ssh_pass
+      - name: ansible_ssh_password
+  optional_args:
+    type: dict
+    description:
+      - Dictionary of additional arguments passed to underlying driver
+    vars:
+      - name: ansible_napalm_optional_args
+  persistent_connect_timeout:
+    type: int
+    description:
+      - Time in seconds an idle session is kept open before the connection is shut down.
+    default: 30
+    ini:
+      - section: persistent_connection
+        key: connect_timeout
+    env:
+      - name: ANSIBLE_PERSISTENT_CONNECT_TIMEOUT
+    vars:
+      - name: ansible_connect_timeout
+  persistent_command_timeout:
+    type: int
+    description:
+      - Time in seconds to wait for the device to respond. Also used as the driver
+        timeout.
+    default: 60
+    ini:
+      - section: persistent_connection
+        key: command_timeout
+    env:
+      - name: ANSIBLE_PERSISTENT_COMMAND_TIMEOUT
+    vars:
+      - name: ansible_command_timeout
+  persistent_log_messages:
+    type: boolean
+    description:
+      - Log every request and response of the persistent connection.
+    default: False
+    ini:
+      - section: persistent_connection
+        key: log_messages
+    env:
+      - name: ANSIBLE_PERSISTENT_LOG_MESSAGES
+    vars:
+      - name: ansible_persistent_log_messages
+"""
+
+import threading
+
+from ansible.errors import AnsibleConnectionFailure, AnsibleError
+from ansible.module_utils._text import to_text
+from ansible.module_utils.connection import ConnectionError
+from ansible.plugins.connection import NetworkConnectionBase
+
+napalm_found = False
+try:
+    from napalm import get_network_driver
+    from napalm.base import ModuleImportError
+
+    napalm_found = True
+except ImportError:
+    pass
+
+# Keep in sync with module_utils/napalm_common.py
+NOT_IMPLEMENTED_ERROR = -32001
+
+
+class Connection(NetworkConnectionBase):
+    """NAPALM persistent connection"""
+
+    transport = "napalm"
+    has_pipelining = False
+
+    def __init__(self, play_context, *args, **kwargs):
+        super(Connection, self).__init__(play_context, *args, **kwargs)
+        self.napalm = None
+        self._opening = None
+        self._open_error = None
+
+    def _connect(self):
+        if self._opening is not None:
+            # wait for the session napalm_open started in the background
+            self._opening.join()
+            self._opening = None
+            if self._open_error is not None:
+                error, self._open_error = self._open_error, None
+                raise error
+
+        if self.napalm is None:
+            self._open_session()
+
+    def _open_session(self):
+        if not napalm_found:
+            raise AnsibleError("the python module napalm is required")
+
+        if not self._network_os:
+            raise AnsibleConnectionFailure(
+                "Unable to automatically determine host network os. Please "
+                "manually configure ansible_network_os value for this host"
+            )
+
+        try:
+            network_driver = get_network_driver(self._network_os)
+        except ModuleImportError as e:
+            raise AnsibleConnectionFailure(
+                "Failed to import napalm driver: " + to_text(e)
+            )
+
+        optional_args = dict(self.get_option("optional_args") or {})
+        if self.get_option("port"):
+            optional_args.setdefault("port", self.get_option("port"))
+
+        device = network_driver(
+            hostname=self.get_option("host") or self._play_context.remote_addr,
+            username=self.get_option("remote_user"),
+            password=self.get_option("password"),
+            timeout=self.get_option("persistent_command_timeout"),
+            optional_args=optional_args,
+        )
+        try:
+            device.open()
+        except Exception as e:
+            raise AnsibleConnectionFailure("cannot connect to device: " + to_text(e))
+
+        self.napalm = device
+        self._sub_plugin = {"name": "napalm", "obj": self.napalm}
+        self.queue_message(
+            "vvvv", "opened napalm session for network_os %s" % self._network_os
+        )
+        self._connected = True
+
+    def _open_in_background(self):
+        try:
+            self._open_session()
+        except Exception as e:
+            self._open_error = e
+
+    def napalm_open(self, wait=False):
+        """Open the driver session ahead of the tasks using it.
+
+        Unless wait, the session is opened in a background thread and the call
+        returns at once, the next napalm_call waits for it. Returns whether the
+        session is open.
+        """
+        if wait:
+            self._connect()
+        elif self.napalm is None and self._opening is None:
+            self._opening = threading.Thread(target=self._open_in_background)
+            self._opening.daemon = True
+            self._opening.start()
+        return self.napalm is not None
+
+    def napalm_call(self, method, *args, **kwargs):
+        """Run a method of the open NAPALM driver on behalf of a module."""
+        self._connect()
+        try:
+            return getattr(self.napalm, method)(*args, **kwargs)
+        except NotImplementedError as e:
+            raise ConnectionError(to_text(e), code=NOT_IMPLEMENTED_ERROR)
+
+    def close(self):
+        if self._opening is not None:
+            self._opening.join()
+            self._opening = None
+        if self.napalm is not None:
+            self.queue_message("vvvv", "closing napalm session")
+            self.napalm.close()
+            self.napalm = None
+        super(Connection, self).close()
@@ -0,0 +1,87 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+    # options of the session to the device, their argument spec is
+    # CONNECTION_SPEC in module_utils/napalm_common.py
+    DOCUMENTATION = """
+options:
+    connect_timeout:
+        description:
+          - Seconds to wait for a TCP connection to the transport port of the device
+            (C(port) in optional_args, or the port of the driver's transport) before
+            the driver is even instantiated, an unreachable device fails in that
+            time instead of the driver's timeout. 0 disables the check.
+        required: False
+        default: 0
+    broker:
+        description:
+          - Path of the Unix socket of a napalm-ansible-broker. The session is leased
+            from the broker, which keeps it open for the next tasks and playbooks and
+            lets one task at a time use a device, instead of connecting in the task.
+            Can be set for every task with C(ansible_napalm_broker).
+        required: False
+    credentials:
+        description:
+          - "Credential sets tried in turn until the device accepts one, instead of C(username)
+            and C(password). Each item takes username (required), password,
+            optional_args merged over the task's (e.g. secret or key_file) and name,
+            reported in C(credential) and remembered instead of a hash of the
+            username and password. The one that worked last for the host is tried
+            first, it is remembered in a store under the state directory, encrypted
+            with C(credentials_key). Any other error than a rejected login fails
+            right away. Needs the cryptography python module."
+        required: False
+    detect:
+        description:
+          - "Settings of the C(dev_os: auto) detection: C(snmp_community) to query
+            the sysDescr (over C(snmp_port), 161), C(ssh_port) (22), C(https_port)
+            (443), C(timeout) (3 seconds per fingerprint), C(signatures) mapping more
+            drivers to a regular expression of their fingerprint, tried first, and
+            C(refresh) to detect again instead of using the remembered dev_os"
+        required: False
+    credentials_key:
+        description:
+          - Fernet key encrypting the store of C(credentials), defaults to
+            C(NAPALM_ANSIBLE_CREDENTIALS_KEY) or a key generated on first use next to
+            the store
+        required: False
+    limits:
+        description:
+          - "Limits shared by the tasks of every fork and playbook on the controller
+            giving the same label, e.g. the TACACS server or the site of the device.
+            Each item takes label (required), concurrency (operations at the same
+            time), rate (operations per second), burst (operations allowed at once
+            by rate, default 1) and operations, the ones it applies to: open (the
+            default, opening the session) and, for napalm_install_config, commit
+            (committing the configuration)."
+        required: False
+    limit_timeout:
+        description:
+          - Seconds to wait for the C(limits) before failing
+        required: False
+        default: 300
+    adaptive_timeout:
+        description:
+          - Derive the driver's timeout from the time the operations of the module
+            (opening the session, then the getters, commands, configuration steps or
+            ping it runs) took on the previous runs of the host, three times their
+            95th percentile and at least 10 seconds. C(timeout) wins over the
+            derived timeout, it is used until every operation ran a few times and
+            the derived one never exceeds it.
+        required: False
+        default: False
+        choices: [True, False]
+    circuit_breaker:
+        description:
+          - Seconds a device that failed to connect is not contacted again, doubled
+            after every consecutive failure up to a day. The failures are shared by
+            every run on the controller, meanwhile the tasks fail at once with
+            C(circuit_open). Once the window elapses a single attempt goes through,
+            the other tasks keep failing until it succeeds, closing the circuit,
+            or fails. 0 disables the circuit breaker.
+        required: False
+        default: 0
+"""
@@ -0,0 +1,120 @@
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+author: "NAPALM Automation (@napalm-automation)"
+strategy: napalm
+short_description: Free strategy giving the forks to the slowest hosts first
+description:
+  - Runs like the C(free) strategy, every host moves on to its next task as soon
+    as the previous one is done, without waiting for the other hosts.
+  - When a fork frees up it goes to the host with the most work left, estimated
+    from the time every module took on that host on the previous runs, so the
+    slowest devices don't start last and set the duration of the play.
+  - Hosts without history go first, in inventory order, which is the order of the
+    C(free) strategy on the first run.
+  - Only the napalm_* modules count, their durations are recorded per host and
+    module under C(~/.ansible/napalm/durations) (or
+    C($NAPALM_ANSIBLE_STATE_DIR/durations)), the other tasks are not timed.
+"""
+
+import time
+
+from ansible.plugins.strategy.free import StrategyModule as FreeStrategyModule
+
+try:
+    from ansible.module_utils.napalm_cache import state_dir
+    from ansible.module_utils.napalm_stats import OperationStats
+except ImportError:
+    from napalm_ansible.module_utils.napalm_cache import state_dir
+    from napalm_ansible.module_utils.napalm_stats import OperationStats
+
+
+def result_host_task(result):
+    """Name of the host and task of a result, the attributes depend on Ansible."""
+    host = getattr(result, "host", None) or result._host
+    task = getattr(result, "task", None) or result._task
+    return host.name, task
+
+
+def napalm_action(action):
+    """Whether action, short or fully qualified, runs a napalm_* module."""
+    return action.split(".")[-1].startswith("napalm_")
+
+
+class StrategyModule(FreeStrategyModule):
+    def __init__(self, tqm):
+        super(StrategyModule, self).__init__(tqm)
+        self._durations = {}
+        # napalm modules of the play, a module run twice counts twice
+        self._play_actions = []
+        # seconds of the recorded tasks each host ran in this play
+        self._done = {}
+        self._started = {}
+
+    def _host_durations(self, host_name):
+        if host_name not in self._durations:
+            self._durations[host_name] = OperationStats(
+                host_name, state_dir("durations")
+            )
+        return self._durations[host_name]
+
+    def _remaining(self, host_name):
+        """Seconds of work expected from host_name, None without history."""
+        durations = self._host_durations(host_name)
+        expected = [durations.get(action) for action in self._play_actions]
+        if all(seconds is None for seconds in expected):
+            return None
+        total = sum(seconds for seconds in expected if seconds is not None)
+        return max(0.0, total - self._done.get(host_name, 0.0))
+
+    def get_hosts_left(self, iterator):
+        """Hosts left, the ones with the most work left first.
+
+        The free strategy hands the forks out walking this list from its
+        start, so the longest hosts get the next free fork.
+        """
+        hosts_left = super(StrategyModule, self).get_hosts_left(iterator)
+
+        def key(host):
+            remaining = self._remaining(host.get_name())
+            return (remaining is not None, -(remaining or 0.0))
+
+        return sorted(hosts_left, key=key)
+
+    # the two hooks below are private to StrategyBase, they only time the
+    # napalm tasks and pass everything through
+    def _queue_task(self, host, task, *args, **kwargs):
+        super(StrategyModule, self)._queue_task(host, task, *args, **kwargs)
+        # queued once a worker took the task
+        if napalm_action(task.action):
+            self._started[(host.get_name(), task._uuid)] = time.monotonic()
+
+    def _process_pending_results(self, iterator, *args, **kwargs):
+        results = super(StrategyModule, self)._process_pending_results(
+            iterator, *args, **kwargs
+        )
+        for result in results:
+            host_name, task = result_host_task(result)
+            started = self._started.pop((host_name, task._uuid), None)
+            if started is None:
+                continue
+            elapsed = time.monotonic() - started
+            self._host_durations(host_name).record(task.action, elapsed)
+            self._done[host_name] = self._done.get(host_name, 0.0) + elapsed
+        return results
+
+    def run(self, iterator, play_context):
+        self._play_actions = [
+            task.action
+            for block in iterator._play.compile()
+            for task in block.get_tasks()
+            if napalm_action(task.action)
+        ]
+        self._done = {}
+        try:
+            return super(StrategyModule, self).run(iterator, play_context)
+        finally:
+            for durations in self._durations.values():
+                durations.save()
@@ -26,5 +26,10 @@ setup(
     url="https://github.com/napalm-automation/napalm-ansible",
     include_package_data=True,
     install_requires=reqs,
-    entry_points={"console_scripts": ["napalm-ansible=napalm_ansible:main"]},
+    entry_points={
+        "console_scripts": [
+            "napalm-ansible=napalm_ansible:main",
+            "napalm-ansible-broker=napalm_ansible.broker:main",
+        ]
+    },
 )
@@ -0,0 +1,20 @@
+"""Mock driver rejecting the passwords listed in optional_args.rejected_passwords."""
+
+from napalm.base.exceptions import ConnectAuthError
+
+# the module, napalm would pick an imported MockDriver as the driver
+from napalm.base import mock
+
+
+class RejectingDriver(mock.MockDriver):
+    def __init__(self, hostname, username, password, timeout=60, optional_args=None):
+        optional_args = dict(optional_args or {})
+        self.rejected_passwords = optional_args.pop("rejected_passwords", [])
+        super(RejectingDriver, self).__init__(
+            hostname, username, password, timeout, optional_args
+        )
+
+    def open(self):
+        if self.password in self.rejected_passwords:
+            raise ConnectAuthError("Authentication failed for " + self.username)
+        super(RejectingDriver, self).open()
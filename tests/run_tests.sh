@@ -6,18 +6,49 @@ ansible-playbook -i napalm_connection/hosts napalm_connection/connection_info_in
 ansible-playbook -i napalm_connection/hosts napalm_connection/connection_info_in_args.yaml -u vagrant
 ansible-playbook -i napalm_connection/hosts napalm_connection/connection_ansible_network_os.yaml -u vagrant
 ANSIBLE_REMOTE_USER=vagrant ansible-playbook -i napalm_connection/hosts napalm_connection/connection_info_in_env.yaml 
+ansible-playbook -i napalm_connection/hosts napalm_connection/connection_persistent.yaml -u vagrant
+ansible-playbook -i napalm_connection/hosts napalm_connection/connection_warm.yaml -u vagrant
+ansible-playbook -i napalm_connection/hosts napalm_connection/connection_network_cli.yaml -u vagrant
 
 ansible-playbook -i napalm_install_config/hosts -l "*.dry_run.*" napalm_install_config/config.yaml -C
 ansible-playbook -i napalm_install_config/hosts -l "*.commit.*" napalm_install_config/config.yaml
 ansible-playbook -i napalm_install_config/hosts -l "*.error*" napalm_install_config/config_error.yaml
+ansible-playbook -i napalm_install_config/hosts -l merge.commit.change napalm_install_config/config_resume.yaml
 
 ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_ok.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_ok.yaml -l multiple_facts.ok -e "ansible_napalm_import_modules=true"
 ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_not_implemented.yaml -l multiple_facts.not_implemented -e "ignore_notimplemented=true"
 ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_not_implemented.yaml -l multiple_facts.not_implemented -e "ignore_notimplemented=false"
 ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_error.yaml -l multiple_facts.error
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_error.yaml -l multiple_facts.error -e "ansible_napalm_import_modules=true"
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_cache.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_export.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_delta.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_resume.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_probe.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_deadline.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_adaptive.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_limits.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_credentials.yaml -l multiple_facts.ok
+ansible-playbook -i napalm_get_facts/hosts napalm_get_facts/get_facts_detect.yaml -l multiple_facts.ok
 
 ansible-playbook -i napalm_cli/hosts -l multiple_commands.ok napalm_cli/multiple_commands.yaml
+ansible-playbook -i napalm_cli/hosts -l multiple_commands.ok napalm_cli/multiple_commands.yaml -e "ansible_napalm_import_modules=true"
 ansible-playbook -i napalm_cli/hosts -l wrong_commands.err napalm_cli/wrong_args.yaml
 ansible-playbook -i napalm_cli/hosts -l multiple_commands.ok napalm_cli/check_mode.yaml -C
 
+ansible-playbook -i napalm_reachability/hosts napalm_reachability/reachability.yaml
+ansible-playbook -i napalm_reachability/hosts napalm_reachability/circuit_breaker.yaml
+
+ansible-playbook -i napalm_broker/hosts napalm_broker/broker.yaml
+
+rm -rf napalm_cache/.facts
+ANSIBLE_CACHE_PLUGIN=napalm ANSIBLE_CACHE_PLUGIN_CONNECTION=napalm_cache/.facts ansible-playbook -i napalm_cache/hosts napalm_cache/cache_write.yaml
+ANSIBLE_CACHE_PLUGIN=napalm ANSIBLE_CACHE_PLUGIN_CONNECTION=napalm_cache/.facts ansible-playbook -i napalm_cache/hosts napalm_cache/cache_read.yaml
+rm -rf napalm_cache/.facts
+
+rm -rf napalm_strategy/.state
+NAPALM_ANSIBLE_STATE_DIR=$PWD/napalm_strategy/.state ansible-playbook -i napalm_strategy/hosts napalm_strategy/strategy.yaml -f 1
+rm -rf napalm_strategy/.state
+
 echo "All tests successful!"
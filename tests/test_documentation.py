@@ -9,6 +9,20 @@ module_files = glob("napalm_ansible/modules/napalm_*.py")
 modules = [module.split(".")[0].replace("/", ".") for module in module_files]
 
 
+def load_documentation(module):
+    """DOCUMENTATION of module with the options of its doc fragments, as ansible-doc."""
+    docs = yaml.safe_load(module.DOCUMENTATION)
+    fragments = docs.pop("extends_documentation_fragment", [])
+    if not isinstance(fragments, list):
+        fragments = [fragments]
+    for name in fragments:
+        fragment = import_module("napalm_ansible.plugins.doc_fragments." + name)
+        options = yaml.safe_load(fragment.ModuleDocFragment.DOCUMENTATION)["options"]
+        options.update(docs.get("options") or {})
+        docs["options"] = options
+    return docs
+
+
 @pytest.fixture(params=modules)
 def ansible_module(request):
     return request.param
@@ -24,7 +38,7 @@ def test_module_documentation_exists(ansible_module):
 
 def test_module_documentation_format(ansible_module):
     module = import_module(ansible_module)
-    docs = yaml.safe_load(module.DOCUMENTATION)
+    docs = load_documentation(module)
     assert "author" in docs.keys()
     assert "description" in docs.keys()
     assert "short_description" in docs.keys()
@@ -38,13 +52,22 @@ def test_module_examples_format(ansible_module):
     module = import_module(ansible_module)
     module_name = ansible_module.replace("napalm_ansible.", "")
     examples = yaml.safe_load(module.EXAMPLES)
-    params = yaml.safe_load(module.DOCUMENTATION)["options"].keys()
+    params = load_documentation(module)["options"].keys()
     for example in examples:
         if module_name in example.keys():
             for param in example[module_name]:
                 assert param in params
 
 
+def test_module_arguments_documented(ansible_module):
+    module = import_module(ansible_module)
+    if not hasattr(module, "CONNECTION_SPEC"):
+        return
+    params = load_documentation(module)["options"].keys()
+    for param in module.CONNECTION_SPEC:
+        assert param in params
+
+
 def test_module_return_format(ansible_module):
     module = import_module(ansible_module)
     yaml.safe_load(module.RETURN)
@@ -58,7 +81,7 @@ def test_build_docs(ansible_module):
 
     module = import_module(ansible_module)
     content = {}
-    content["doc"] = yaml.safe_load(module.DOCUMENTATION)
+    content["doc"] = load_documentation(module)
     content["examples"] = module.EXAMPLES
     content["example_lines"] = module.EXAMPLES.split("\n")
     content["return_values"] = yaml.safe_load(module.RETURN)